@@ -0,0 +1,102 @@
+# Daily absentee job: one INSERT ... SELECT per chunk of users instead of a
+# query and an insert per user.
+#
+# Backfill days the job missed:
+#   python -m absentees 2026-10-01 2026-10-17
+import argparse
+import time
+from datetime import date, datetime, timedelta, time as dtime
+
+from sqlalchemy import Boolean, Date, Float, String, Time, exists, func, literal, select
+
+from config import ABSENTEE_DEFAULT_CUTOFF, ABSENTEE_CHUNK_SIZE
+from database import SessionLocal, dialect_insert
+from model import Attendance, AttendanceStatusEnum, Company, User
+
+DEFAULT_CUTOFF = dtime.fromisoformat(ABSENTEE_DEFAULT_CUTOFF)
+
+
+def absentee_select(day, now, first_id, last_id):
+    # Users in [first_id, last_id) without a row for day, limited to companies
+    # whose cut-off has passed when now is given
+    query = (
+        select(
+            User.id,
+            literal(day, Date),
+            literal(now.time() if now else DEFAULT_CUTOFF, Time),
+            literal(None, String),
+            literal(0.0, Float),
+            literal(0.0, Float),
+            literal("Not Marked", String),
+            literal(100.0, Float),
+            literal(False, Boolean),
+            literal(False, Boolean),
+            literal(AttendanceStatusEnum.absent.value, String),
+            literal(0.0, Float),
+        )
+        .join(Company, User.company_id == Company.id)
+        .where(User.id >= first_id, User.id < last_id)
+        .where(~exists().where(Attendance.user_id == User.id, Attendance.date == day))
+    )
+    if now is not None:
+        query = query.where(func.coalesce(Company.absentee_cutoff, literal(DEFAULT_CUTOFF, Time)) <= now.time())
+    return query
+
+
+def mark_absentees(db, day, now=None):
+    # Insert Absent rows for day; returns how many were added
+    started = time.perf_counter()
+    first_id, last_id = db.query(func.min(User.id), func.max(User.id)).one()
+    if first_id is None:
+        return 0
+
+    insert = dialect_insert(db)
+    columns = [
+        "user_id", "date", "time", "image_path", "latitude", "longitude", "resolved_address",
+        "radius_meter", "location_verified", "face_verified", "status", "confidence",
+    ]
+    added = 0
+    for chunk_start in range(first_id, last_id + 1, ABSENTEE_CHUNK_SIZE):
+        stmt = insert(Attendance).from_select(
+            columns, absentee_select(day, now, chunk_start, chunk_start + ABSENTEE_CHUNK_SIZE)
+        ).on_conflict_do_nothing(index_elements=["user_id", "date"]).returning(Attendance.id)
+        # rowcount isn't reliable for INSERT ... SELECT across drivers; count what came back
+        added += len(db.execute(stmt).all())
+        # Commit per chunk so a large tenant doesn't hold one long transaction
+        db.commit()
+
+    print(f"Absentees for {day}: {added} rows in {time.perf_counter() - started:.2f}s")
+    return added
+
+
+def run_absentee_job():
+    # Scheduled every few minutes; each company is handled once its cut-off has passed
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        return mark_absentees(db, now.date(), now)
+    finally:
+        db.close()
+
+
+def backfill_absentees(db, start, end):
+    added = 0
+    day = start
+    while day <= end:
+        added += mark_absentees(db, day)
+        day += timedelta(days=1)
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill Absent rows for days the daily job missed")
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat, nargs="?")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = backfill_absentees(db, args.start, args.end or args.start)
+        print(f"Backfill added {total} rows")
+    finally:
+        db.close()
@@ -0,0 +1,53 @@
+"""Add indexes for hot filters
+
+Revision ID: 1c7a5e3f9b42
+Revises: 0b6e9c4d2f15
+Create Date: 2026-10-18 19:26:04.837215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c7a5e3f9b42'
+down_revision: Union[str, Sequence[str], None] = '0b6e9c4d2f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING_ADDRESS = sa.text("resolved_address = 'Pending'")
+
+# (name, table, columns, extra kwargs); attendance (user_id, date) is already
+# covered by uq_attendance_user_date
+INDEXES = [
+    ('ix_attendance_user_id_status', 'attendance', ['user_id', 'status'], {}),
+    ('ix_attendance_pending_address', 'attendance', ['id'],
+     {'postgresql_where': PENDING_ADDRESS, 'sqlite_where': PENDING_ADDRESS}),
+    ('ix_goals_user_id_status', 'goals', ['user_id', 'status'], {}),
+    ('ix_goals_user_id_end_date', 'goals', ['user_id', 'end_date'], {}),
+    ('ix_skills_user_id_status', 'skills', ['user_id', 'status'], {}),
+    ('ix_images_user_id', 'images', ['user_id'], {}),
+    ('ix_face_templates_user_id', 'face_templates', ['user_id'], {}),
+    ('ix_users_company_id', 'users', ['company_id'], {}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction; it keeps the
+    # tables writable while the indexes build
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, if_not_exists=True,
+                postgresql_concurrently=True, **kwargs,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,132 @@
+"""Partition attendance by month
+
+Revision ID: 2d8f6b1a7c53
+Revises: 1c7a5e3f9b42
+Create Date: 2026-10-18 20:14:37.529804
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d8f6b1a7c53'
+down_revision: Union[str, Sequence[str], None] = '1c7a5e3f9b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, date, time, image_path, latitude, longitude, resolved_address, radius_meter, "
+    "location_verified, face_verified, status, user_id, confidence"
+)
+
+# Rows without a date can't be keyed by date; they land in attendance_default
+COPY_SELECT = COLUMNS.replace("date, time", "COALESCE(date, DATE '1970-01-01'), time", 1)
+
+COLUMN_DDL = """
+    date DATE NOT NULL,
+    time TIME,
+    image_path VARCHAR,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    resolved_address VARCHAR NOT NULL,
+    radius_meter FLOAT,
+    location_verified BOOLEAN,
+    face_verified BOOLEAN,
+    status VARCHAR,
+    user_id INTEGER NOT NULL CONSTRAINT attendance_user_id_fkey REFERENCES users (id),
+    confidence FLOAT
+"""
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retire_old_table(name):
+    # Free the constraint and index names for the table that replaces it
+    op.execute(f"ALTER TABLE attendance RENAME TO {name}")
+    op.execute(f"ALTER TABLE {name} RENAME CONSTRAINT attendance_pkey TO {name}_pkey")
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS attendance_user_id_fkey")
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS uq_attendance_user_date")
+    for index in ("ix_attendance_id", "ix_attendance_user_id_status", "ix_attendance_pending_address",
+                  "ix_attendance_date_brin"):
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def create_indexes():
+    op.execute("ALTER TABLE attendance ADD CONSTRAINT uq_attendance_user_date UNIQUE (user_id, date)")
+    op.execute("CREATE INDEX ix_attendance_id ON attendance (id)")
+    op.execute("CREATE INDEX ix_attendance_user_id_status ON attendance (user_id, status)")
+    op.execute(
+        "CREATE INDEX ix_attendance_pending_address ON attendance (id) WHERE resolved_address = 'Pending'"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # Only Postgres partitions; elsewhere the date index is an ordinary one
+        op.create_index('ix_attendance_date_brin', 'attendance', ['date'], unique=False)
+        return
+
+    # A partition for every month that has rows, plus this month and the next few
+    rows = op.get_bind().execute(sa.text(
+        "SELECT DISTINCT date_trunc('month', date)::date FROM attendance WHERE date IS NOT NULL"
+    ))
+    this_month = date.today().replace(day=1)
+    months = {row[0] for row in rows} | {add_months(this_month, n) for n in range(MONTHS_AHEAD + 1)}
+
+    retire_old_table("attendance_unpartitioned")
+
+    # The primary key of a partitioned table has to include the partition key
+    op.execute(f"""
+        CREATE TABLE attendance (
+            id INTEGER NOT NULL DEFAULT nextval('attendance_id_seq'),
+            {COLUMN_DDL},
+            PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    op.execute("CREATE TABLE attendance_default PARTITION OF attendance DEFAULT")
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE attendance_{month:%Y_%m} PARTITION OF attendance "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        )
+
+    op.execute(f"INSERT INTO attendance ({COLUMNS}) SELECT {COPY_SELECT} FROM attendance_unpartitioned")
+    op.execute("ALTER SEQUENCE attendance_id_seq OWNED BY attendance.id")
+    op.execute("DROP TABLE attendance_unpartitioned")
+
+    create_indexes()
+    # Rows arrive roughly in date order, so a BRIN index covers date-range scans in a few pages
+    op.execute("CREATE INDEX ix_attendance_date_brin ON attendance USING brin (date)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index('ix_attendance_date_brin', table_name='attendance')
+        return
+
+    retire_old_table("attendance_partitioned")
+
+    op.execute(f"""
+        CREATE TABLE attendance (
+            id INTEGER NOT NULL DEFAULT nextval('attendance_id_seq'),
+            {COLUMN_DDL.replace('date DATE NOT NULL', 'date DATE', 1)},
+            PRIMARY KEY (id)
+        )
+    """)
+    op.execute(f"INSERT INTO attendance ({COLUMNS}) SELECT {COLUMNS} FROM attendance_partitioned")
+    op.execute("ALTER SEQUENCE attendance_id_seq OWNED BY attendance.id")
+    # Drops the partitions with it; detached archive partitions are left alone
+    op.execute("DROP TABLE attendance_partitioned")
+
+    create_indexes()
@@ -0,0 +1,30 @@
+"""Add embedding to images
+
+Revision ID: 3b7d1c9e4a21
+Revises: 5fb110299bdf
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d1c9e4a21'
+down_revision: Union[str, Sequence[str], None] = '5fb110299bdf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+    op.add_column('images', sa.Column('embedding_model', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('images', 'embedding_model')
+    op.drop_column('images', 'embedding')
@@ -0,0 +1,38 @@
+"""Add face_templates table
+
+Revision ID: a4c2e8f1d305
+Revises: 3b7d1c9e4a21
+Create Date: 2026-10-18 11:02:17.645190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c2e8f1d305'
+down_revision: Union[str, Sequence[str], None] = '3b7d1c9e4a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('face_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('embedding', sa.LargeBinary(), nullable=False),
+    sa.Column('embedding_model', sa.String(), nullable=False),
+    sa.Column('photo_count', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_face_templates_id'), 'face_templates', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_face_templates_id'), table_name='face_templates')
+    op.drop_table('face_templates')
@@ -0,0 +1,42 @@
+"""Unique attendance per user per day
+
+Revision ID: c81f0b7d2e94
+Revises: a4c2e8f1d305
+Create Date: 2026-10-18 14:37:52.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f0b7d2e94'
+down_revision: Union[str, Sequence[str], None] = 'a4c2e8f1d305'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the row upsert_attendance would have kept: a check-in beats Absent, and
+    # the first check-in of the day is never overwritten, so the oldest one wins
+    op.execute("""
+        DELETE FROM attendance WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, date
+                    ORDER BY CASE status WHEN 'Present' THEN 0 WHEN 'Pending' THEN 1 ELSE 2 END, id
+                ) AS rn
+                FROM attendance
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    op.create_unique_constraint('uq_attendance_user_date', 'attendance', ['user_id', 'date'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_attendance_user_date', 'attendance', type_='unique')
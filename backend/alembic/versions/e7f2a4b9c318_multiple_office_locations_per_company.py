@@ -0,0 +1,31 @@
+"""Multiple office locations per company
+
+Revision ID: e7f2a4b9c318
+Revises: d5a9e3c7b610
+Create Date: 2026-10-18 17:12:40.318527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7f2a4b9c318'
+down_revision: Union[str, Sequence[str], None] = 'd5a9e3c7b610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('office_location', sa.Column('name', sa.String(), nullable=False, server_default='Main office'))
+    op.alter_column('office_location', 'name', server_default=None)
+    op.create_index(op.f('ix_office_location_company_id'), 'office_location', ['company_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_office_location_company_id'), table_name='office_location')
+    op.drop_column('office_location', 'name')
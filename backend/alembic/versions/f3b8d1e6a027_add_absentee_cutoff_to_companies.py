@@ -0,0 +1,28 @@
+"""Add absentee_cutoff to companies
+
+Revision ID: f3b8d1e6a027
+Revises: e7f2a4b9c318
+Create Date: 2026-10-18 18:02:11.604395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d1e6a027'
+down_revision: Union[str, Sequence[str], None] = 'e7f2a4b9c318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('companies', sa.Column('absentee_cutoff', sa.Time(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('companies', 'absentee_cutoff')
@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, UploadFile, HTTPException, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from model import Attendance, OfficeLocation, User, AttendanceStatusEnum
-from model_train.face_recog import recognize_user
-from database import get_db
-from auth import verify_token
+from model import Attendance, User, AttendanceStatusEnum
+from model_train.face_recog import (
+    get_embedding_async, get_group_embeddings_async, recognize_embedding, recognize_group, verify_embedding, inference_metrics,
+    inference_pool,
+)
+from model_train.inference_pool import InferenceBusy
+from model_train.stream import StreamSession
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+from database import get_db, dialect_insert
+from auth import verify_token, decode_token
 from datetime import datetime
-import shutil, os
-from math import radians, cos, sin, sqrt, atan2
-import requests
+from config import ATTENDANCE_MAX_IMAGE_BYTES
+from contextlib import contextmanager
+import time
+import threading
+import os
+from sites import site_cache
+from geocoding import quick_address, geocode_metrics, PENDING_ADDRESS
 from datetime import date
 from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi import FastAPI
@@ -19,62 +30,133 @@ security = HTTPBearer()
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Haversine formula to calculate distance between two lat/lng points
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371000  # Earth radius in meters
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
-
-# 🔁 Reverse Geocode using Nominatim
-def get_address_from_coords(lat: float, lon: float) -> str:
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {"lat": lat, "lon": lon, "format": "json"}
-        headers = {"User-Agent": "attendance-app"}
-        res = requests.get(url, params=params, headers=headers)
-        res.raise_for_status()
-        return res.json().get("display_name", "Unknown Location")
-    except Exception as e:
-        print(f"[Geocode error]: {e}")
-        return "Unknown Location"
+# 🔁 Gazetteer or cached address if we have one; otherwise the row is saved as
+# pending and the background resolver looks it up, so check-ins never wait on Nominatim
+def get_address_from_coords(lat: float, lon: float, db: Session) -> str:
+    return quick_address(lat, lon, db) or PENDING_ADDRESS
 
-@route.post("/attendance")
-async def mark_attendance(
-    image: UploadFile = File(...),
-    latitude: float = Form(...),
-    longitude: float = Form(...),
-    db: Session = Depends(get_db),
-    payload: dict = Depends(verify_token),
-):
-   
-    filename = f"{datetime.utcnow().timestamp()}_{image.filename}"
-    image_path = os.path.join(UPLOAD_DIR, filename)
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+class StageTimer:
+    # Per-stage wall time of one request, reported in the Server-Timing header
+    def __init__(self):
+        self.timings = {}
 
-    
-    recognized_user, confidence = recognize_user(image_path, db)
-    if not recognized_user:
-        raise HTTPException(status_code=400, detail="❌ Face not recognized")
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - started) * 1000
 
-    user = db.query(User).filter(User.name == recognized_user).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="❌ Recognized user not found")
+    def header(self):
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.timings.items())
+
+# JPEG, PNG, WebP, BMP
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG", b"RIFF", b"BM")
+
+def check_image(image_bytes: bytes):
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="❌ Empty image")
+    if len(image_bytes) > ATTENDANCE_MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="❌ Image too large")
+    if not image_bytes.startswith(IMAGE_SIGNATURES):
+        raise HTTPException(status_code=400, detail="❌ Unsupported image format")
+
+class MarkedToday:
+    # user_id -> id of today's check-in, so retries are answered without a DB scan
+    def __init__(self):
+        self.day = None
+        self.ids = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            if self.day != date.today():
+                self.day, self.ids = date.today(), {}
+            return self.ids.get(user_id)
+
+    def add(self, attendance):
+        if attendance.status == AttendanceStatusEnum.absent:
+            return
+        with self.lock:
+            if self.day != attendance.date:
+                self.day, self.ids = attendance.date, {}
+            self.ids[attendance.user_id] = attendance.id
+
+marked_today = MarkedToday()
+
+def today_attendance(user_id, db):
+    # Absent rows from the daily job don't count: a late check-in may still replace them
+    attendance_id = marked_today.get(user_id)
+    if attendance_id is not None:
+        attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
+        if attendance:
+            return attendance
+
+    attendance = db.query(Attendance).filter(
+        Attendance.user_id == user_id,
+        Attendance.date == date.today(),
+        Attendance.status != AttendanceStatusEnum.absent,
+    ).first()
+    if attendance:
+        marked_today.add(attendance)
+    return attendance
+
+def upsert_attendance(attendance, db):
+    # Insert the day's row; a conflicting Absent row (daily job) is overwritten,
+    # an existing check-in is kept. Returns the row that ends up stored.
+    values = {
+        column.name: getattr(attendance, column.key)
+        for column in Attendance.__table__.columns
+        if column.name != "id" and getattr(attendance, column.key) is not None
+    }
+    insert = dialect_insert(db)
+    stmt = insert(Attendance).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "date"],
+        set_={key: stmt.excluded[key] for key in values if key not in ("user_id", "date")},
+        where=Attendance.status == AttendanceStatusEnum.absent,
+    ).returning(Attendance.id)
+    row = db.execute(stmt).first()
+
+    stored = db.query(Attendance).populate_existing().filter(
+        Attendance.user_id == values["user_id"], Attendance.date == values["date"]
+    )
+    return stored.first() if row is None else stored.filter(Attendance.id == row[0]).first()
 
-    office = db.query(OfficeLocation).first()
-    if not office:
+def find_site(latitude, longitude, company_id, db):
+    # Which of the company's office sites the coordinate is at (or nearest to)
+    office, distance, inside = site_cache.get(company_id, db).locate(latitude, longitude)
+    if office is None:
         raise HTTPException(status_code=500, detail="❌ Office location not configured")
+    return office, distance, inside
 
-    
-    distance = calculate_distance(latitude, longitude, office.latitude, office.longitude)
-    location_verified = distance <= office.radius_meter
-    face_verified = True
+def check_geofence(latitude, longitude, company_id, db):
+    office, distance, inside = find_site(latitude, longitude, company_id, db)
+    if not inside:
+        raise HTTPException(
+            status_code=403, detail=f"❌ Outside office radius ({round(distance)} m from {office.name})"
+        )
+    return office, distance
+
+def upload_path(image: UploadFile) -> str:
+    filename = f"{datetime.utcnow().timestamp()}_{os.path.basename(image.filename or 'image.jpg')}"
+    return os.path.join(UPLOAD_DIR, filename)
+
+def write_upload(image_path: str, data: bytes):
+    # Runs after the response is sent; only accepted check-ins are kept
+    with open(image_path, "wb") as buffer:
+        buffer.write(data)
+
+def locate(latitude, longitude, company_id, db):
+    office, distance, location_verified = find_site(latitude, longitude, company_id, db)
 
     
-    resolved_address = get_address_from_coords(latitude, longitude)
+    resolved_address = get_address_from_coords(latitude, longitude, db)
+    return office, distance, location_verified, resolved_address
+
+def new_attendance(user, image_path, latitude, longitude, confidence, office, location_verified, resolved_address):
+    face_verified = True
 
     
     if face_verified and location_verified:
@@ -83,7 +165,7 @@ async def mark_attendance(
         status = AttendanceStatusEnum.pending
 
     
-    attendance = Attendance(
+    return Attendance(
         image_path=image_path,
         latitude=latitude,
         longitude=longitude,
@@ -97,27 +179,270 @@ async def mark_attendance(
         date = date.today(),
         time=datetime.now().time()
     )
-    db.add(attendance)
-    db.commit()
-    db.refresh(attendance)
 
+def attendance_response(attendance, user, distance, office=None):
     return {
         "message": "✅ Attendance marked",
-        "user": recognized_user,
-        "status": status,
-        "distance_from_office_m": round(distance, 2),
-        "confidence": round(confidence, 2),
-        "location_verified": location_verified,
-        "face_verified": face_verified,
-        "address": resolved_address,
+        "user": user.name,
+        "status": attendance.status,
+        "site": office.name if office else None,
+        "distance_from_office_m": round(distance, 2) if distance is not None else None,
+        "confidence": round(attendance.confidence, 2),
+        "location_verified": attendance.location_verified,
+        "face_verified": attendance.face_verified,
+        "address": attendance.resolved_address,
         "attendance_id": attendance.id,
         "Date": attendance.date,
         "Time": attendance.time
     
     }
 
+def save_attendance(attendance, db):
+    attendance = upsert_attendance(attendance, db)
+    db.commit()
+    db.refresh(attendance)
+    marked_today.add(attendance)
+    return attendance
+
+def record_attendance(user, image_path, latitude, longitude, confidence, db):
+    office, distance, location_verified, resolved_address = locate(latitude, longitude, user.company_id, db)
+    attendance = new_attendance(
+        user, image_path, latitude, longitude, confidence, office, location_verified, resolved_address
+    )
+    attendance = save_attendance(attendance, db)
+
+    return attendance_response(attendance, user, distance, office)
+
+def record_group_attendance(matches, image_path, latitude, longitude, company_id, db):
+    # All recognized employees in one photo are written in a single transaction
+    office, distance, location_verified, resolved_address = locate(latitude, longitude, company_id, db)
+    records = []
+    for user, confidence in matches:
+        attendance = new_attendance(
+            user, image_path, latitude, longitude, confidence, office, location_verified, resolved_address
+        )
+        records.append((upsert_attendance(attendance, db), user))
+    db.commit()
+    for attendance, _ in records:
+        db.refresh(attendance)
+        marked_today.add(attendance)
+    return [attendance_response(attendance, user, distance, office) for attendance, user in records]
+
+async def embed_probe(image_bytes, group=False):
+    # Shed load instead of queueing without bound during the check-in rush
+    try:
+        if group:
+            return await get_group_embeddings_async(image_bytes)
+        return await get_embedding_async(image_bytes)
+    except InferenceBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Face recognition is busy, please retry",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+def check_in_prechecks(user_id, latitude, longitude, db, timer):
+    # The cheap database stages of a check-in, run together in one threadpool call.
+    # Returns (user, today's existing check-in, office, distance)
+    with timer.stage("auth"):
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="❌ User not found")
+
+    with timer.stage("already_marked"):
+        existing = today_attendance(user.id, db)
+    if existing:
+        return user, existing, None, None
+
+    with timer.stage("geofence"):
+        office, distance = check_geofence(latitude, longitude, user.company_id, db)
+    return user, None, office, distance
+
+@route.post("/attendance")
+async def mark_attendance(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(verify_token),
+):
+    # Stages run cheapest first and any of them can end the request, so
+    # retries, out-of-office and junk uploads never reach the face model
+    timer = StageTimer()
+    try:
+        user, existing, office, distance = await run_in_threadpool(
+            check_in_prechecks, payload["id"], latitude, longitude, db, timer
+        )
+        if existing:
+            response.headers["Server-Timing"] = timer.header()
+            return {**attendance_response(existing, user, None), "message": "✅ Attendance already marked"}
+
+        with timer.stage("image"):
+            image_bytes = await image.read()
+            check_image(image_bytes)
+
+        with timer.stage("face"):
+            embedding = await embed_probe(image_bytes)
+            accepted, confidence = await run_in_threadpool(verify_embedding, embedding, user, db)
+            if not accepted:
+                raise HTTPException(status_code=400, detail="❌ Face not recognized")
+
+        with timer.stage("geocode"):
+            resolved_address = await run_in_threadpool(get_address_from_coords, latitude, longitude, db)
+
+        with timer.stage("save"):
+            image_path = upload_path(image)
+            attendance = new_attendance(user, image_path, latitude, longitude, confidence, office, True, resolved_address)
+            attendance = await run_in_threadpool(save_attendance, attendance, db)
+    except HTTPException as e:
+        e.headers = {**(e.headers or {}), "Server-Timing": timer.header()}
+        raise
+
+    background_tasks.add_task(write_upload, image_path, image_bytes)
+    response.headers["Server-Timing"] = timer.header()
+    return attendance_response(attendance, user, distance, office)
+
+
+@route.post("/kiosk-attendance")
+async def mark_kiosk_attendance(
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(verify_token),
+):
+    # Shared device logged in with an admin account: identify the employee by 1:N search
+    admin = db.query(User).filter(User.id == payload["id"], User.role == "admin").first()
+    if not admin:
+        raise HTTPException(status_code=403, detail="Only admin devices can run kiosk attendance")
+
+    image_bytes = await image.read()
+
+    
+    embedding = await embed_probe(image_bytes)
+    recognized_user, confidence = await run_in_threadpool(recognize_embedding, embedding, admin.company_id, db)
+    if not recognized_user:
+        raise HTTPException(status_code=400, detail="❌ Face not recognized")
+
+    user = db.query(User).filter(User.name == recognized_user).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="❌ Recognized user not found")
+
+    image_path = upload_path(image)
+    response = await run_in_threadpool(record_attendance, user, image_path, latitude, longitude, confidence, db)
+    background_tasks.add_task(write_upload, image_path, image_bytes)
+    return response
+
+
+@route.post("/kiosk-group-attendance")
+async def mark_group_attendance(
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(verify_token),
+):
+    # Lobby tablet: one photo of a group marks everyone recognized in it
+    admin = db.query(User).filter(User.id == payload["id"], User.role == "admin").first()
+    if not admin:
+        raise HTTPException(status_code=403, detail="Only admin devices can run kiosk attendance")
+
+    image_bytes = await image.read()
+
+    
+    embeddings = await embed_probe(image_bytes, group=True)
+    if not embeddings:
+        raise HTTPException(status_code=400, detail="❌ No faces detected")
+
+    recognized = await run_in_threadpool(recognize_group, embeddings, admin.company_id, db)
+    if not recognized:
+        raise HTTPException(status_code=400, detail="❌ Face not recognized")
+
+    users = db.query(User).filter(User.name.in_([name for name, _ in recognized])).all()
+    confidences = dict(recognized)
+    matches = [(user, confidences[user.name]) for user in users]
+
+    image_path = upload_path(image)
+    records = await run_in_threadpool(record_group_attendance, matches, image_path, latitude, longitude, admin.company_id, db)
+    background_tasks.add_task(write_upload, image_path, image_bytes)
+    return {
+        "message": f"✅ Attendance marked for {len(records)} employee(s)",
+        "faces_detected": len(embeddings),
+        "records": records,
+    }
+
+
+def record_recognized(name, company_id, latitude, longitude, confidence, db):
+    # The gallery can still hold a user who has since been renamed or removed
+    user = db.query(User).filter(User.name == name, User.company_id == company_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="❌ Recognized user not found")
+    return record_attendance(user, None, latitude, longitude, confidence, db)
+
+
+@route.websocket("/stream")
+async def stream_attendance(
+    websocket: WebSocket,
+    token: str,
+    latitude: float,
+    longitude: float,
+    db: Session = Depends(get_db),
+):
+    # Turnstile camera: binary JPEG frames in, recognition events out.
+    # Each face is tracked across frames and embedded once, attendance is written once per person.
+    payload = decode_token(token)
+    admin = payload and db.query(User).filter(User.id == payload.get("id"), User.role == "admin").first()
+    if not admin:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    session = StreamSession()
+    marked = set()
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+            try:
+                with inference_pool.slot():
+                    results = await loop.run_in_executor(inference_pool.executor, session.process_frame, data)
+            except InferenceBusy:
+                # Drop the frame rather than fall behind the camera
+                await websocket.send_json({"event": "dropped", "frame": session.frame_index})
+                continue
 
+            for track, embedding in results:
+                name, confidence = await run_in_threadpool(recognize_embedding, embedding, admin.company_id, db)
+                event = {"event": "unknown", "track_id": track.id, "frame": session.frame_index}
+                if name:
+                    track.user_name = name
+                    event.update(event="recognized", user=name, confidence=round(confidence, 2))
+                    if name not in marked:
+                        try:
+                            record = await run_in_threadpool(
+                                record_recognized, name, admin.company_id, latitude, longitude, confidence, db
+                            )
+                        except HTTPException as e:
+                            # Report and keep streaming; another sighting of this person retries
+                            event.update(event="error", detail=e.detail)
+                            await websocket.send_json(event)
+                            continue
+                        marked.add(name)
+                        event["attendance_id"] = record["attendance_id"]
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        print(f"Stream closed: {session.stats()}")
 
 
+@route.get("/inference-metrics")
+def get_inference_metrics(payload: dict = Depends(verify_token)):
+    return inference_metrics()
 
 
+@route.get("/geocode-metrics")
+def get_geocode_metrics(payload: dict = Depends(verify_token)):
+    return geocode_metrics()
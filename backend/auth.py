@@ -86,6 +86,14 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
 
 
 
+def decode_token(token: str):
+    # For WebSocket clients, which pass the token as a query parameter
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        print(f"Token verification failed: {e}")
+        return None
+
         
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
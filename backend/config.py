@@ -0,0 +1,124 @@
+import os
+
+# Runtime settings, overridable through environment variables
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+# Face recognition
+FACE_MODEL_WEIGHTS = os.getenv("FACE_MODEL_WEIGHTS", "vggface2")
+FACE_MATCH_THRESHOLD = env_float("FACE_MATCH_THRESHOLD", 0.4)
+FACE_GALLERY_TTL = env_float("FACE_GALLERY_TTL", 300)
+# Galleries are per company; least recently used ones are evicted above this budget
+FACE_GALLERY_MEMORY_MB = env_float("FACE_GALLERY_MEMORY_MB", 256)
+
+# "exact" scans the whole gallery, "ivf" searches FACE_IVF_NPROBE of FACE_IVF_NLIST cells
+FACE_INDEX = os.getenv("FACE_INDEX", "exact")
+FACE_IVF_NLIST = env_int("FACE_IVF_NLIST", 0)
+FACE_IVF_NPROBE = env_int("FACE_IVF_NPROBE", 8)
+FACE_INDEX_PATH = os.getenv("FACE_INDEX_PATH", "indexes/face_ivf.npz")
+
+# Micro-batching of concurrent check-ins
+FACE_BATCH_MAX_SIZE = env_int("FACE_BATCH_MAX_SIZE", 16)
+FACE_BATCH_MAX_WAIT_MS = env_float("FACE_BATCH_MAX_WAIT_MS", 10)
+
+# Worker threads for face inference and how many check-ins may wait for them
+FACE_INFERENCE_WORKERS = env_int("FACE_INFERENCE_WORKERS", 2)
+FACE_INFERENCE_QUEUE_LIMIT = env_int("FACE_INFERENCE_QUEUE_LIMIT", 64)
+FACE_RETRY_AFTER = env_int("FACE_RETRY_AFTER", 2)
+
+# Load and exercise the face models during startup instead of on the first check-in
+FACE_WARMUP_ON_STARTUP = env_bool("FACE_WARMUP_ON_STARTUP", False)
+
+# Database
+CREATE_SCHEMA_ON_STARTUP = env_bool("CREATE_SCHEMA_ON_STARTUP", True)
+
+# CPU inference tuning: "eager", "traced" or "quantized" (int8 dynamic + traced)
+FACE_INFERENCE_MODE = os.getenv("FACE_INFERENCE_MODE", "eager")
+FACE_TORCH_THREADS = env_int("FACE_TORCH_THREADS", 0)
+FACE_CHANNELS_LAST = env_bool("FACE_CHANNELS_LAST", False)
+# Max cosine distance between optimized and eager embeddings of the same face
+FACE_OPTIMIZED_TOLERANCE = env_float("FACE_OPTIMIZED_TOLERANCE", 0.02)
+
+# Photos are downscaled to this longest side before face detection; the face is
+# still cropped from the full-resolution image
+FACE_DETECT_MAX_SIDE = env_int("FACE_DETECT_MAX_SIDE", 640)
+# Early rejection of unusable photos (0 disables the check)
+FACE_MIN_IMAGE_SIDE = env_int("FACE_MIN_IMAGE_SIDE", 80)
+FACE_MIN_SHARPNESS = env_float("FACE_MIN_SHARPNESS", 0)
+# Group photos keep more resolution: MTCNN drops faces under 40 px after the
+# downscale, and a lobby shot has small faces (0 detects at full size)
+FACE_GROUP_DETECT_MAX_SIDE = env_int("FACE_GROUP_DETECT_MAX_SIDE", 1920)
+
+# Match against "raw" photos, per-user "centroid" templates, or "rerank"
+# (shortlist by template, then score the shortlisted users' photos). Rerank keeps
+# only templates resident, so each 1:N match also reads the shortlisted users'
+# photo embeddings from the database: one query for FACE_RERANK_CANDIDATES users
+FACE_MATCH_MODE = os.getenv("FACE_MATCH_MODE", "rerank")
+FACE_TEMPLATES_PER_USER = env_int("FACE_TEMPLATES_PER_USER", 1)
+FACE_TEMPLATE_OUTLIER_DISTANCE = env_float("FACE_TEMPLATE_OUTLIER_DISTANCE", 0.35)
+FACE_RERANK_CANDIDATES = env_int("FACE_RERANK_CANDIDATES", 5)
+
+# Unix socket of the shared inference server; empty keeps inference in-process
+FACE_SERVER_SOCKET = os.getenv("FACE_SERVER_SOCKET", "")
+
+# Streaming check-in: detection size per frame and face tracking
+FACE_STREAM_DETECT_MAX_SIDE = env_int("FACE_STREAM_DETECT_MAX_SIDE", 320)
+FACE_TRACK_MAX_MISSING = env_int("FACE_TRACK_MAX_MISSING", 15)
+FACE_TRACK_REEMBED_GAIN = env_float("FACE_TRACK_REEMBED_GAIN", 1.3)
+
+# Attendance
+ATTENDANCE_MAX_IMAGE_BYTES = env_int("ATTENDANCE_MAX_IMAGE_BYTES", 10 * 1024 * 1024)
+# Office sites are cached per company; other workers pick up admin edits after this many seconds
+OFFICE_SITE_TTL = env_float("OFFICE_SITE_TTL", 60)
+OFFICE_SITE_CELL_DEGREES = env_float("OFFICE_SITE_CELL_DEGREES", 0.01)
+
+# Daily absentee job: runs every ABSENTEE_CHECK_MINUTES and marks each company
+# once its cut-off (companies.absentee_cutoff, else this default) has passed
+ABSENTEE_DEFAULT_CUTOFF = os.getenv("ABSENTEE_DEFAULT_CUTOFF", "12:00")
+ABSENTEE_CHECK_MINUTES = env_int("ABSENTEE_CHECK_MINUTES", 15)
+ABSENTEE_CHUNK_SIZE = env_int("ABSENTEE_CHUNK_SIZE", 5000)
+
+# Reverse geocoding cache: coordinates are snapped to a grid of this many degrees
+# (0.001 deg is roughly 110 m)
+GEOCODE_CELL_DEGREES = env_float("GEOCODE_CELL_DEGREES", 0.001)
+GEOCODE_CACHE_SIZE = env_int("GEOCODE_CACHE_SIZE", 10000)
+GEOCODE_CACHE_TTL = env_int("GEOCODE_CACHE_TTL", 30 * 24 * 3600)
+GEOCODE_TIMEOUT = env_float("GEOCODE_TIMEOUT", 5)
+# Seconds between Nominatim requests (their usage policy allows 1/s)
+GEOCODE_MIN_INTERVAL = env_float("GEOCODE_MIN_INTERVAL", 1.0)
+# Background resolver for attendance rows saved with a pending address
+GEOCODE_RESOLVER_INTERVAL = env_float("GEOCODE_RESOLVER_INTERVAL", 10)
+GEOCODE_RESOLVER_BATCH = env_int("GEOCODE_RESOLVER_BATCH", 200)
+GEOCODE_MAX_ATTEMPTS = env_int("GEOCODE_MAX_ATTEMPTS", 5)
+# "remote" (Nominatim) or "local" (offline gazetteer lookup; falls back to
+# Nominatim when no place is near enough unless GEOCODER_REMOTE_FALLBACK is off)
+GEOCODER_BACKEND = os.getenv("GEOCODER_BACKEND", "remote")
+GEOCODER_REMOTE_FALLBACK = env_bool("GEOCODER_REMOTE_FALLBACK", True)
+# Required with the local backend; data/gazetteer_sample.csv is a small test fixture only
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+GAZETTEER_CELL_DEGREES = env_float("GAZETTEER_CELL_DEGREES", 0.05)
+GAZETTEER_MAX_DISTANCE_M = env_float("GAZETTEER_MAX_DISTANCE_M", 2000)
+
+# Only one process runs scheduled jobs and the address resolver: the holder of
+# a Postgres advisory lock (or, on other databases, a lock file)
+SCHEDULER_LOCK_KEY = env_int("SCHEDULER_LOCK_KEY", 72410391)
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "scheduler.lock")
+SCHEDULER_LEADER_RETRY = env_float("SCHEDULER_LEADER_RETRY", 30)
+# How many past days a new leader backfills if the job didn't run
+SCHEDULER_CATCHUP_DAYS = env_int("SCHEDULER_CATCHUP_DAYS", 7)
+
+# Postgres attendance partitions: months created ahead of time, and how many
+# months to keep attached (older ones are detached as attendance_archive_*; 0 keeps all)
+ATTENDANCE_PARTITIONS_AHEAD = env_int("ATTENDANCE_PARTITIONS_AHEAD", 3)
+ATTENDANCE_RETENTION_MONTHS = env_int("ATTENDANCE_RETENTION_MONTHS", 0)
@@ -10,8 +10,10 @@ from fastapi import UploadFile
 
 from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlalchemy.orm import Session
-from geopy.geocoders import Nominatim
+from geocoding import reverse_geocode
 from model import OfficeLocation
+from sites import site_cache, adopt_legacy_sites
+from stats import status_counts, attendance_record_query
 from database import get_db
 
 
@@ -30,11 +32,20 @@ from model import UserImage,User,Attendance,Goal
 from database import get_db 
 
 from auth import verify_token
+from model_train.face_recog import (
+    store_embeddings, add_to_gallery, remove_from_gallery, rebuild_user_templates, replace_user_templates,
+    run_inference_async,
+)
+from model_train.inference_pool import InferenceBusy
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 route = APIRouter()
 security = HTTPBearer()
 
 class OfficeLocationSchema(BaseModel):
+    # Sites are matched by id, then by name within the admin's company; no match adds a new site.
+    # Leaving name out keeps a site's current name, or names a new one "Main office"
+    id: Optional[int] = None
+    name: Optional[str] = None
     latitude: float
     longitude: float
     radius_meter: float
@@ -43,10 +54,26 @@ class OfficeLocationSchema(BaseModel):
 class SearchUser(BaseModel):
     name:str
 
+class SearchUserAttendance(SearchUser):
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+
 class UploadImage(BaseModel):
     image_path : str
     
   
+def enroll_images(images, user_id, db):
+    # Embed once at enrollment so attendance never re-reads reference photos
+    for db_image, embedding in zip(images, store_embeddings(images)):
+        if embedding is None:
+            print(f"No face detected in {db_image.image_path}")
+    db.commit()
+
+    templates = rebuild_user_templates(user_id, db)
+    db.commit()
+    return templates
+
 @route.post('/upload-images')  
 async def Upload_Images(
     files:list[UploadFile],
@@ -60,15 +87,38 @@ async def Upload_Images(
     save_dir = f"images/user_{user_id}/"
     os.makedirs(save_dir,exist_ok=True)
     
+    images = []
+    new_files = []
     for file in files :
         file_location = os.path.join(save_dir,file.filename)
+        if not os.path.exists(file_location):
+            new_files.append(file_location)
         with open(file_location,"wb") as f:
             f.write(await file.read())
             
         db_image = UserImage(user_id=user_id, image_path=file_location)
         db.add(db_image)
-    
-    db.commit()
+        images.append(db_image)
+
+    # Detection and embedding run on the inference threads, not the event loop
+    try:
+        templates = await run_inference_async(enroll_images, images, user_id, db)
+    except InferenceBusy as e:
+        # Nothing was committed; drop the rows and photos this upload added
+        db.rollback()
+        for path in new_files:
+            if os.path.exists(path):
+                os.remove(path)
+        raise HTTPException(
+            status_code=503,
+            detail="Face recognition is busy, please retry",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    user = db.query(User).filter(User.id == user_id).first()
+    for db_image in images:
+        add_to_gallery(db_image, user)
+    replace_user_templates(user, templates)
     return {"message": "Images uploaded successfully"}
 
 
@@ -93,18 +143,31 @@ def set_office_location(
     radius_meter = request.radius_meter
 
     
-    geolocator = Nominatim(user_agent="attendance_app")
-    try:
-        location = geolocator.reverse(f"{latitude}, {longitude}", exactly_one=True)
-        resolved_address = location.address if location else "Unknown"
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Reverse geocoding failed: {str(e)}")
+    resolved_address = reverse_geocode(latitude, longitude, db)
+    if resolved_address is None:
+        raise HTTPException(status_code=500, detail="Reverse geocoding failed")
 
     
-    office = db.query(OfficeLocation).first()
+    # Shared locations from before sites were per company are copied, not taken over
+    adopted = adopt_legacy_sites(admin.company_id, db)
+    sites = db.query(OfficeLocation).filter(OfficeLocation.company_id == admin.company_id).order_by(OfficeLocation.id)
+    name = request.name or "Main office"
+    if request.id is not None:
+        office = adopted.get(request.id) or sites.filter(OfficeLocation.id == request.id).first()
+        if office is None:
+            raise HTTPException(status_code=404, detail="Office location not found")
+    else:
+        office = sites.filter(OfficeLocation.name == name).first()
+
+    if office and request.name and sites.filter(
+        OfficeLocation.name == request.name, OfficeLocation.id != office.id
+    ).first():
+        raise HTTPException(status_code=409, detail="Another office location already has this name")
 
     if office:
-        
+
+        if request.name:
+            office.name = request.name
         office.latitude = latitude
         office.longitude = longitude
         office.radius_meter = radius_meter
@@ -112,6 +175,7 @@ def set_office_location(
     else:
         
         office = OfficeLocation(
+            name=name,
             latitude=latitude,
             longitude=longitude,
             radius_meter=radius_meter,
@@ -122,10 +186,13 @@ def set_office_location(
     
     db.commit()
     db.refresh(office)
+    site_cache.invalidate(admin.company_id)
 
     return {
         "message": "Office location set successfully",
         "data": {
+            "id": office.id,
+            "name": office.name,
             "latitude": office.latitude,
             "longitude": office.longitude,
             "radius_meter": office.radius_meter,
@@ -134,16 +201,48 @@ def set_office_location(
     }
 
 
+@route.get("/office-locations")
+def list_office_locations(db: Session = Depends(get_db), payload: dict = Depends(verify_token)):
+    user = db.query(User).filter(User.id == payload["id"]).first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return [site._asdict() for site in site_cache.get(user.company_id, db).sites]
+
+
+@route.delete("/office-locations/{location_id}")
+def delete_office_location(location_id: int, db: Session = Depends(get_db), payload: dict = Depends(verify_token)):
+    admin = db.query(User).filter(User.id == payload["id"], User.role == "admin").first()
+    if admin is None:
+        raise HTTPException(status_code=403, detail="Only admin can remove office locations")
+
+    office = db.query(OfficeLocation).filter(
+        OfficeLocation.id == location_id, OfficeLocation.company_id == admin.company_id
+    ).first()
+    if office is None:
+        raise HTTPException(status_code=404, detail="Office location not found")
+
+    db.delete(office)
+    db.commit()
+    site_cache.invalidate(admin.company_id)
+    return {"message": "Office location removed"}
+
+
 @route.get("/attendance-stats",description="Get attendance record for the user")
-def atttendance_record(payload:dict=Depends(verify_token),db:Session=Depends(get_db)):
+def atttendance_record(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    payload:dict=Depends(verify_token),
+    db:Session=Depends(get_db),
+):
     user_id = payload["id"]
     
     if not user_id:
         raise HTTPException(status_code = 401,detail="Unauthorized")
     
-    Present_count = db.query(Attendance).filter(Attendance.user_id == user_id,Attendance.status == "Present").count()
-    Absent_count = db.query(Attendance).filter(Attendance.user_id == user_id,Attendance.status == "Absent").count()
-    Pending_count = db.query(Attendance).filter(Attendance.user_id == user_id,Attendance.status == "Pending").count()
+    counts = status_counts(user_id, start, end, db)
+    Present_count = counts.get("Present", 0)
+    Absent_count = counts.get("Absent", 0)
+    Pending_count = counts.get("Pending", 0)
     
     
     
@@ -262,7 +361,7 @@ def search_user_goals(request:SearchUser,db:Session = Depends(get_db),payload:di
     }
     
 @route.post("/search-user-attendance",description = "Search user attendance by name")
-def search_user_attendance(request:SearchUser,db:Session=Depends(get_db),payload:dict=Depends(verify_token)):
+def search_user_attendance(request:SearchUserAttendance,db:Session=Depends(get_db),payload:dict=Depends(verify_token)):
     user_id = payload["id"]
     print("Incoming name:", request.name)
 
@@ -275,12 +374,13 @@ def search_user_attendance(request:SearchUser,db:Session=Depends(get_db),payload
     if not user:
         raise HTTPException(status_code=404,detail="User not found")
     
-    attendance = db.query(Attendance).filter(Attendance.user_id == user.id).count()
+    counts = status_counts(user.id, request.start, request.end, db)
+    attendance = sum(counts.values())
     if  attendance ==0:
         return []
     
-    present_count = db.query(Attendance).filter(Attendance.user_id == user.id,Attendance.status =="Present").count()
-    Absent_count = db.query(Attendance).filter(Attendance.user_id == user.id,Attendance.status == "Absent").count()
+    present_count = counts.get("Present", 0)
+    Absent_count = counts.get("Absent", 0)
     
     
     if attendance != 0:
@@ -316,6 +416,7 @@ def remove_user(request:SearchUser,db:Session = Depends(get_db),payload:dict=Dep
     remove_user = db.query(User).filter(User.id == user.id).first()
     if not remove_user:
         raise HTTPException(status_code=404,detail="User not found")
+    remove_from_gallery(user)
     db.delete(remove_user)
     db.commit()
     return {"message": "User removed successfully"}
@@ -376,19 +477,27 @@ def remove_user_images(request:SearchUser,db:Session = Depends(get_db),payload:d
         if os.path.exists(img.image_path):
             os.remove(img.image_path)
     db.commit()
+    rebuild_user_templates(user.id, db)
+    db.commit()
+    remove_from_gallery(user)
     return {"message": "User images removed successfully"}
 
 
 
 @route.get("/attendance-record",description = "Get attendance record for the user")
 
-def attendance_record(db:Session = Depends(get_db),payload:dict = Depends(verify_token)):
+def attendance_record(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db:Session = Depends(get_db),
+    payload:dict = Depends(verify_token),
+):
     user_id = payload["id"]
     
     if not user_id:
         raise HTTPException(status_code=401,detail = "Unauthorized")
     
-    attendance_record = db.query(Attendance).filter(Attendance.user_id == user_id).all()
+    attendance_record = attendance_record_query(user_id, start, end, db).all()
     
     return {
         "attendance_record": [
@@ -0,0 +1,98 @@
+# EXPLAIN the per-user filters behind the stats, goal, growth and attendance
+# routes and fail if any of them has to scan a whole table. The attendance
+# stats and record statements come from stats.py, the helpers the routes call.
+#
+#   python -m explain_hot_queries            # the configured database
+#   python -m explain_hot_queries --sqlite   # fresh in-memory schema from the models
+#
+# On Postgres sequential scans are disabled for the check, so a small or empty
+# table still shows whether an index can serve the query.
+import argparse
+import json
+import sys
+from datetime import date
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+
+from model import Attendance, Base, FaceTemplate, Goal, SkillStatusEnum, Skills, User, UserImage
+from stats import attendance_record_query, status_counts_query
+
+USER_ID = 1
+TODAY = date(2026, 1, 15)
+MONTH_START = date(2026, 1, 1)
+
+
+def hot_queries(db):
+    return [
+        ("attendance stats", status_counts_query(USER_ID, None, None, db).statement),
+        ("attendance stats in period", status_counts_query(USER_ID, MONTH_START, TODAY, db).statement),
+        ("attendance record", attendance_record_query(USER_ID, None, None, db).statement),
+        ("attendance record in period", attendance_record_query(USER_ID, MONTH_START, TODAY, db).statement),
+        ("attendance today", select(Attendance.id).where(
+            Attendance.user_id == USER_ID, Attendance.date == TODAY)),
+        ("pending addresses", select(Attendance.id).where(
+            Attendance.resolved_address == "Pending").order_by(Attendance.id).limit(200)),
+        ("goal stats by status", select(func.count()).select_from(Goal).where(
+            Goal.user_id == USER_ID, Goal.status == "Complete")),
+        ("goals ending today", select(func.count()).select_from(Goal).where(
+            Goal.end_date == TODAY, Goal.status == "Pending", Goal.user_id == USER_ID)),
+        ("active goals", select(Goal.id).where(Goal.end_date > TODAY, Goal.user_id == USER_ID)),
+        ("skill stats by status", select(func.count()).select_from(Skills).where(
+            Skills.user_id == USER_ID, Skills.status == SkillStatusEnum.completed)),
+        ("reference images", select(UserImage.id).where(UserImage.user_id == USER_ID)),
+        ("face templates", select(FaceTemplate.id).where(FaceTemplate.user_id == USER_ID)),
+        ("company users", select(User.id).where(User.company_id == USER_ID)),
+    ]
+
+
+def postgres_seq_scans(plan):
+    scans = []
+    if plan.get("Node Type") == "Seq Scan":
+        scans.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        scans.extend(postgres_seq_scans(child))
+    return scans
+
+
+def full_scans(connection, stmt):
+    # Tables the plan reads without an index
+    sql = str(stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    if connection.dialect.name == "postgresql":
+        raw = connection.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        return postgres_seq_scans(plan[0]["Plan"])
+
+    details = [row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    return [d.split()[1] for d in details if d.startswith("SCAN ") and " USING " not in d]
+
+
+def check(engine):
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, stmt in hot_queries(Session(bind=connection)):
+            scans = full_scans(connection, stmt)
+            status = "SEQ SCAN " + ", ".join(scans) if scans else "ok"
+            print(f"{name:<28} {status}")
+            failures += bool(scans)
+        connection.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query falls back to a sequential scan")
+    parser.add_argument("--sqlite", action="store_true", help="check a fresh in-memory schema built from the models")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+    else:
+        from database import engine
+
+    failed = check(engine)
+    if failed:
+        print(f"{failed} hot queries scan a whole table")
+    sys.exit(1 if failed else 0)
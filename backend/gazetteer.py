@@ -0,0 +1,103 @@
+import csv
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+
+def haversine_m(lat, lon, lats, lons):
+    # Distance in meters from one point to arrays of points
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    # Points bucketed into cells of cell_degrees; a radius query only looks at
+    # the cells overlapping the search box, then ranks them with one vectorized
+    # haversine call
+
+    def __init__(self, lats, lons, cell_degrees):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_degrees = cell_degrees
+        buckets = {}
+        for i, cell in enumerate(zip(self.cell_of(self.lats), self.cell_of(self.lons))):
+            buckets.setdefault(cell, []).append(i)
+        self.cells = {cell: np.asarray(ids, dtype=np.int64) for cell, ids in buckets.items()}
+
+    def __len__(self):
+        return len(self.lats)
+
+    def cell_of(self, degrees):
+        return np.floor(np.asarray(degrees) / self.cell_degrees).astype(np.int64).tolist()
+
+    def within(self, lat, lon, radius_m):
+        # (ids, distances) of every point within radius_m
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        lat_lo, lat_hi = self.cell_of([lat - dlat, lat + dlat])
+        lon_lo, lon_hi = self.cell_of([lon - dlon, lon + dlon])
+
+        found = [
+            self.cells[(i, j)]
+            for i in range(lat_lo, lat_hi + 1)
+            for j in range(lon_lo, lon_hi + 1)
+            if (i, j) in self.cells
+        ]
+        if not found:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        ids = np.concatenate(found)
+        distances = haversine_m(lat, lon, self.lats[ids], self.lons[ids])
+        keep = distances <= radius_m
+        return ids[keep], distances[keep]
+
+    def nearest(self, lat, lon, radius_m):
+        # (id, distance) of the closest point within radius_m, or None
+        ids, distances = self.within(lat, lon, radius_m)
+        if len(ids) == 0:
+            return None
+        best = int(np.argmin(distances))
+        return int(ids[best]), float(distances[best])
+
+
+class Gazetteer:
+    # Offline reverse geocoder over a CSV of named places:
+    #   name,latitude,longitude[,locality][,country]
+
+    def __init__(self, addresses, lats, lons, cell_degrees):
+        self.addresses = addresses
+        self.index = GridIndex(lats, lons, cell_degrees)
+
+    @classmethod
+    def load(cls, path, cell_degrees):
+        addresses, lats, lons = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                parts = [row.get("name"), row.get("locality"), row.get("country")]
+                addresses.append(", ".join(p.strip() for p in parts if p and p.strip()))
+                lats.append(float(row["latitude"]))
+                lons.append(float(row["longitude"]))
+        print(f"Loaded {len(addresses)} gazetteer places from {path}")
+        return cls(addresses, lats, lons, cell_degrees)
+
+    def lookup(self, lat, lon, max_distance_m):
+        hit = self.index.nearest(lat, lon, max_distance_m)
+        return None if hit is None else self.addresses[hit[0]]
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer(path, cell_degrees):
+    # Loaded once per process, on first lookup
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load(path, cell_degrees)
+    return _gazetteer
@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import update
+
+from config import (
+    GEOCODE_CELL_DEGREES, GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_TIMEOUT,
+    GEOCODE_MIN_INTERVAL, GEOCODE_MAX_ATTEMPTS, GEOCODE_RESOLVER_INTERVAL, GEOCODE_RESOLVER_BATCH,
+    GEOCODER_BACKEND, GEOCODER_REMOTE_FALLBACK, GAZETTEER_PATH, GAZETTEER_CELL_DEGREES, GAZETTEER_MAX_DISTANCE_M,
+)
+from database import SessionLocal
+from gazetteer import get_gazetteer
+from model import Attendance, GeocodeCache
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+USER_AGENT = "attendance-app"
+
+# A missing gazetteer would otherwise only show up as wrong addresses on check-ins
+if GEOCODER_BACKEND == "local" and not GAZETTEER_PATH:
+    raise RuntimeError("GEOCODER_BACKEND=local needs GAZETTEER_PATH set to a gazetteer CSV")
+
+# Attendance rows are written with this address and filled in by the resolver
+PENDING_ADDRESS = "Pending"
+UNKNOWN_ADDRESS = "Unknown Location"
+
+# One pooled HTTP client for every Nominatim call in the process
+http = requests.Session()
+http.headers["User-Agent"] = USER_AGENT
+rate_lock = threading.Lock()
+last_request_at = 0.0
+
+
+def cell_key(lat: float, lon: float) -> str:
+    # Snap to the grid so check-ins from the same building share one entry
+    lat_cell = round(lat / GEOCODE_CELL_DEGREES)
+    lon_cell = round(lon / GEOCODE_CELL_DEGREES)
+    return f"{GEOCODE_CELL_DEGREES}:{lat_cell}:{lon_cell}"
+
+
+def wait_for_rate_limit():
+    # Nominatim's usage policy allows at most one request per second
+    global last_request_at
+    with rate_lock:
+        delay = last_request_at + GEOCODE_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        last_request_at = time.monotonic()
+
+def fetch_address(lat: float, lon: float):
+    try:
+        wait_for_rate_limit()
+        params = {"lat": lat, "lon": lon, "format": "json"}
+        res = http.get(NOMINATIM_URL, params=params, timeout=GEOCODE_TIMEOUT)
+        res.raise_for_status()
+        return res.json().get("display_name")
+    except Exception as e:
+        print(f"[Geocode error]: {e}")
+        return None
+
+
+class AddressCache:
+    # In-process LRU in front of the geocode_cache table; both expire after ttl seconds
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return entry[0]
+
+    def record(self, outcome):
+        with self._lock:
+            if outcome == "db_hit":
+                self.db_hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, address):
+        with self._lock:
+            self._entries[key] = (address, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+cache = AddressCache(GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL)
+
+
+def local_address(lat: float, lon: float):
+    # Nearest gazetteer place when the offline backend is enabled
+    if GEOCODER_BACKEND != "local":
+        return None
+    gazetteer = get_gazetteer(GAZETTEER_PATH, GAZETTEER_CELL_DEGREES)
+    return gazetteer.lookup(lat, lon, GAZETTEER_MAX_DISTANCE_M)
+
+
+def quick_address(lat: float, lon: float, db):
+    # Address without a network call: the gazetteer, then the cache
+    return local_address(lat, lon) or cached_address(lat, lon, db)
+
+
+def cached_address(lat: float, lon: float, db):
+    # Memory or DB cache only, never a network call
+    key = cell_key(lat, lon)
+    address = cache.get(key)
+    if address is not None:
+        return address
+
+    fresh_after = datetime.utcnow() - timedelta(seconds=GEOCODE_CACHE_TTL)
+    row = db.query(GeocodeCache).filter(GeocodeCache.cell == key).first()
+    if row and row.updated_at >= fresh_after:
+        cache.record("db_hit")
+        cache.put(key, row.address)
+        return row.address
+    cache.record("miss")
+    return None
+
+
+def reverse_geocode(lat: float, lon: float, db):
+    # Address for a coordinate, or None when it can't be resolved
+    address = quick_address(lat, lon, db)
+    if address is not None:
+        return address
+    if GEOCODER_BACKEND == "local" and not GEOCODER_REMOTE_FALLBACK:
+        return None
+
+    key = cell_key(lat, lon)
+    address = fetch_address(lat, lon)
+    if address is None:
+        return None
+
+    cache.put(key, address)
+    try:
+        db.merge(GeocodeCache(cell=key, address=address, updated_at=datetime.utcnow()))
+        db.commit()
+    except Exception as e:
+        # Another worker stored the same cell first
+        print(f"[Geocode cache write skipped]: {e}")
+        db.rollback()
+    return address
+
+
+class AddressResolver:
+    # Background thread that fills in attendance rows saved with PENDING_ADDRESS.
+    # It runs only in the scheduler leader and picks rows up every interval seconds.
+    # Rows are grouped by grid cell so each cell costs at most one Nominatim call.
+    # A cell that fails is retried with exponential backoff and given up on
+    # (UNKNOWN_ADDRESS) after max_attempts.
+
+    def __init__(self, interval, batch_size, max_attempts):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.resolved = 0
+        self.failures = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="address-resolver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                after_id = 0
+                while after_id is not None:
+                    after_id = self.sweep(after_id)
+            except Exception as e:
+                print(f"[Address resolver error]: {e}")
+
+    def should_retry(self, key):
+        return time.monotonic() >= self.failures.get(key, (0, 0.0))[1]
+
+    def record_failure(self, key):
+        # True once the cell has used up its attempts
+        attempts = self.failures.get(key, (0, 0.0))[0] + 1
+        self.failures[key] = (attempts, time.monotonic() + self.interval * 2 ** attempts)
+        return attempts >= self.max_attempts
+
+    def sweep(self, after_id=0):
+        # Resolve one batch of pending rows with ids above after_id. Returns the
+        # last id seen, so the next batch pages past cells still backing off, or
+        # None once the batch came back short
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Attendance.id, Attendance.latitude, Attendance.longitude)
+                .filter(Attendance.resolved_address == PENDING_ADDRESS, Attendance.id > after_id)
+                .order_by(Attendance.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            cells = {}
+            for row in rows:
+                cells.setdefault(cell_key(row.latitude, row.longitude), []).append(row)
+
+            written = 0
+            for key, cell_rows in cells.items():
+                if not self.should_retry(key):
+                    continue
+                address = reverse_geocode(cell_rows[0].latitude, cell_rows[0].longitude, db)
+                if address is None:
+                    if not self.record_failure(key):
+                        continue
+                    address = UNKNOWN_ADDRESS
+                self.failures.pop(key, None)
+                db.execute(
+                    update(Attendance)
+                    .where(Attendance.id.in_([row.id for row in cell_rows]))
+                    .values(resolved_address=address)
+                )
+                db.commit()
+                written += len(cell_rows)
+            self.resolved += written
+            return rows[-1].id if len(rows) == self.batch_size else None
+        finally:
+            db.close()
+
+
+resolver = AddressResolver(GEOCODE_RESOLVER_INTERVAL, GEOCODE_RESOLVER_BATCH, GEOCODE_MAX_ATTEMPTS)
+
+
+def geocode_metrics():
+    return {**cache.snapshot(), "resolved_rows": resolver.resolved, "failing_cells": len(resolver.failures)}
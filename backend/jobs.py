@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import func
+
+from absentees import run_absentee_job, backfill_absentees
+from config import ABSENTEE_CHECK_MINUTES, SCHEDULER_CATCHUP_DAYS
+from database import SessionLocal
+from geocoding import resolver
+from model import JobRun
+from partitions import maintain_partitions
+
+# Scheduled work runs only in the leader process (see leader.py)
+scheduler = BackgroundScheduler()
+
+
+def run_logged(job_name, job, *args):
+    # Run a job and record it in job_runs; returns the job's result
+    db = SessionLocal()
+    try:
+        run = JobRun(job_name=job_name, started_at=datetime.utcnow(), status="running")
+        db.add(run)
+        db.commit()
+        try:
+            result = job(*args)
+        except Exception as e:
+            run.status, run.error = "failed", str(e)[:1000]
+            print(f"[Job {job_name} failed]: {e}")
+            result = None
+        else:
+            run.status = "success"
+            run.rows = result if isinstance(result, int) else None
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+def last_success(job_names, db):
+    if isinstance(job_names, str):
+        job_names = [job_names]
+    return (
+        db.query(func.max(JobRun.started_at))
+        .filter(JobRun.job_name.in_(job_names), JobRun.status == "success")
+        .scalar()
+    )
+
+
+def catch_up_absentees():
+    # Days between the last successful run and yesterday were missed while no
+    # process was leader; today is left to the regular schedule
+    db = SessionLocal()
+    try:
+        last_run = last_success(["absentees", "absentees_catch_up"], db)
+        if last_run is None:
+            return 0
+        yesterday = datetime.now().date() - timedelta(days=1)
+        # job_runs times are UTC, so start a day early; re-marking a day is a no-op
+        start = max(last_run.date() - timedelta(days=1), yesterday - timedelta(days=SCHEDULER_CATCHUP_DAYS - 1))
+        if start > yesterday:
+            return 0
+        return backfill_absentees(db, start, yesterday)
+    finally:
+        db.close()
+
+
+def start_jobs():
+    run_logged("absentees_catch_up", catch_up_absentees)
+    run_logged("attendance_partitions", maintain_partitions)
+    resolver.start()
+    if scheduler.running:
+        scheduler.resume()
+        return
+    scheduler.add_job(
+        run_logged, 'cron', args=["absentees", run_absentee_job],
+        minute=f"*/{ABSENTEE_CHECK_MINUTES}", coalesce=True, max_instances=1,
+    )
+    # Upcoming months' partitions exist well before the first check-in lands in them
+    scheduler.add_job(
+        run_logged, 'cron', args=["attendance_partitions", maintain_partitions],
+        hour=1, minute=30, coalesce=True, max_instances=1,
+    )
+    scheduler.start()
+
+
+def pause_jobs():
+    if scheduler.running:
+        scheduler.pause()
+    resolver.stop()
+
+
+def job_status(db):
+    # Latest run of every job
+    latest = (
+        db.query(JobRun.job_name, func.max(JobRun.id).label("id"))
+        .group_by(JobRun.job_name)
+        .subquery()
+    )
+    runs = db.query(JobRun).join(latest, JobRun.id == latest.c.id).order_by(JobRun.job_name).all()
+    return [
+        {
+            "job": run.job_name,
+            "status": run.status,
+            "started_at": run.started_at,
+            "finished_at": run.finished_at,
+            "rows": run.rows,
+            "error": run.error,
+            "last_success": last_success(run.job_name, db),
+        }
+        for run in runs
+    ]
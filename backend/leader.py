@@ -0,0 +1,88 @@
+import threading
+import time
+
+from filelock import FileLock, Timeout
+from sqlalchemy import text
+
+
+class LeaderElection:
+    # Every web worker runs one of these; whichever holds the lock is the
+    # leader. On Postgres that is a session advisory lock on a dedicated
+    # connection, so it is released if the process or its connection dies.
+    # Other databases (SQLite, local runs) use a lock file instead.
+    # Followers retry every retry_seconds so a new leader takes over.
+
+    def __init__(self, engine, lock_key, lock_path, retry_seconds):
+        self.engine = engine
+        self.lock_key = lock_key
+        self.lock_path = lock_path
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._connection = None
+        self._file_lock = None
+        self._thread = None
+
+    def start(self, on_elected, on_lost):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, args=(on_elected, on_lost), name="leader-election", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, on_elected, on_lost):
+        while True:
+            try:
+                if not self.is_leader and self.acquire():
+                    self.is_leader = True
+                    print("This process is now the scheduler leader")
+                    on_elected()
+                elif self.is_leader and not self.still_held():
+                    self.release()
+                    self.is_leader = False
+                    print("Lost scheduler leadership")
+                    on_lost()
+            except Exception as e:
+                print(f"[Leader election error]: {e}")
+            time.sleep(self.retry_seconds)
+
+    def acquire(self):
+        if self.engine.dialect.name == "postgresql":
+            connection = self.engine.connect()
+            locked = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}).scalar()
+            # The lock belongs to the session, not the transaction
+            connection.commit()
+            if locked:
+                self._connection = connection
+            else:
+                connection.close()
+            return bool(locked)
+
+        lock = FileLock(self.lock_path)
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            return False
+        self._file_lock = lock
+        return True
+
+    def still_held(self):
+        if self._connection is None:
+            return self._file_lock is not None
+        try:
+            self._connection.execute(text("SELECT 1"))
+            self._connection.commit()
+            return True
+        except Exception:
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            # Drop the DBAPI connection rather than return it to the pool still holding the lock
+            try:
+                self._connection.invalidate()
+            except Exception:
+                pass
+            self._connection = None
+        if self._file_lock is not None:
+            self._file_lock.release()
+            self._file_lock = None
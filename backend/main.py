@@ -1,17 +1,28 @@
-from fastapi import FastAPI
+import time
+started_at = time.perf_counter()
+
+from fastapi import FastAPI, Depends
 from auth import router as auth_router 
 from goal import router as goal_router
 from dashboard import route as dashboard_route
 from attendance import route as attendance_route
 from growth import router as growth_router
 
-from model import Base, Attendance, AttendanceStatusEnum, User
+from model import Base
 from database import engine, get_db
+from auth import verify_token
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import date
+from config import (
+    CREATE_SCHEMA_ON_STARTUP, FACE_WARMUP_ON_STARTUP,
+    SCHEDULER_LOCK_KEY, SCHEDULER_LOCK_PATH, SCHEDULER_LEADER_RETRY,
+)
+from model_train.face_recog import warm_up
+from leader import LeaderElection
+from jobs import start_jobs, pause_jobs, job_status
+
+imports_done_at = time.perf_counter()
 
 
 app = FastAPI()
@@ -23,8 +34,6 @@ app.include_router(dashboard_route, prefix="/dashboard")
 app.include_router(attendance_route, prefix="/attendance")
 app.include_router(growth_router, prefix="/growth")
 
-Base.metadata.create_all(bind=engine)
-
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,47 +52,24 @@ def greeting_home():
 def greeting_root():
     return {"message": "Welcome to our backend"}
 
+@app.get("/jobs")
+def get_job_status(db: Session = Depends(get_db), payload: dict = Depends(verify_token)):
+    return job_status(db)
 
-scheduler = BackgroundScheduler()
-
-def my_daily_function():
-    db: Session = next(get_db())
-    try:
-        today = date.today()
 
-        # Get all users
-        all_users = db.query(User).all()
+leader = LeaderElection(engine, SCHEDULER_LOCK_KEY, SCHEDULER_LOCK_PATH, SCHEDULER_LEADER_RETRY)
 
-        for user in all_users:
-            
-            existing_attendance = db.query(Attendance).filter(
-                Attendance.user_id == user.id,
-                Attendance.date == today
-            ).first()
-
-            if not existing_attendance:
-                
-                new_attendance = Attendance(
-                    user_id=user.id,
-                    status=AttendanceStatusEnum.absent,
-                    location_verified=False,
-                    face_verified=False,
-                    resolved_address="Not Marked",
-                    image_path=None,
-                    latitude=0.0,
-                    longitude=0.0,
-                    confidence=0.0,
-                )
-                db.add(new_attendance)
+@app.on_event("startup")
+def on_startup():
+    # Schema creation and model warm-up happen here rather than at import time
+    if CREATE_SCHEMA_ON_STARTUP:
+        Base.metadata.create_all(bind=engine)
 
-        db.commit()
-    finally:
-        db.close()
+    if FACE_WARMUP_ON_STARTUP:
+        warm_up()
 
+    # Scheduled jobs and the address resolver run in one worker only
+    leader.start(on_elected=start_jobs, on_lost=pause_jobs)
 
-@app.on_event("startup")
-def on_startup():
-    if not scheduler.running:
-        
-        scheduler.add_job(my_daily_function, 'cron', hour=12, minute=0)
-        scheduler.start()
+    app.state.startup_seconds = time.perf_counter() - started_at
+    print(f"Startup finished in {app.state.startup_seconds:.2f}s (imports {imports_done_at - started_at:.2f}s)")
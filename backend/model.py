@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import ForeignKey,Date,Time,Boolean,Float,Enum as SqlEnum
+from sqlalchemy import ForeignKey,Date,Time,Boolean,Float,LargeBinary,UniqueConstraint,Index,text,Enum as SqlEnum
 from sqlalchemy.orm import relationship
 from enum import Enum
 from datetime import datetime 
@@ -31,19 +31,25 @@ class User(Base):
     role = Column(SqlEnum(RoleEnum), nullable=False)
     position = Column(String,nullable=False)
     age = Column(Integer,nullable=False)
-    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
     company = relationship("Company", back_populates="users")
     
     
     goals = relationship("Goal",back_populates="user")
     attendance = relationship("Attendance",back_populates="user")
     images = relationship("UserImage",back_populates="user", cascade="all, delete-orphan")
+    face_templates = relationship("FaceTemplate",back_populates="user", cascade="all, delete-orphan")
     growth = relationship("Growth",back_populates="user")
     skills = relationship("Skills", back_populates="user", cascade="all, delete-orphan")
     
     
 class Goal(Base):
     __tablename__ = "goals"
+    # Per-user goal stats filter on status and end_date
+    __table_args__ = (
+        Index("ix_goals_user_id_status", "user_id", "status"),
+        Index("ix_goals_user_id_end_date", "user_id", "end_date"),
+    )
     
     id = Column(Integer,primary_key = True,index=True)
     name = Column(String,nullable = False)
@@ -59,9 +65,24 @@ class Goal(Base):
 class Attendance(Base):
     
     __tablename__ = "attendance"
+    # One row per user per day: retries and the daily absentee job upsert into it.
+    # The unique constraint also serves (user_id, date) lookups; status counts use
+    # their own index and the address resolver scans only the pending rows.
+    # On Postgres the table is range-partitioned by month on date (see the
+    # 2d8f6b1a7c53 migration and partitions.py), with primary key (id, date).
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_attendance_user_date"),
+        Index("ix_attendance_user_id_status", "user_id", "status"),
+        Index(
+            "ix_attendance_pending_address", "id",
+            postgresql_where=text("resolved_address = 'Pending'"),
+            sqlite_where=text("resolved_address = 'Pending'"),
+        ),
+        Index("ix_attendance_date_brin", "date", postgresql_using="brin"),
+    )
     
     id = Column(Integer,primary_key = True,index=True)
-    date = Column(Date, default=lambda: datetime.utcnow().date())
+    date = Column(Date, nullable=False, default=lambda: datetime.utcnow().date())
     time = Column(Time, default=lambda: datetime.utcnow().time())
     image_path = Column(String)
     latitude = Column(Float,nullable=False)
@@ -85,6 +106,8 @@ class OfficeLocation(Base):
     __tablename__ = "office_location"
     id = Column(Integer,primary_key = True,index=True)
     
+    name = Column(String, nullable=False, default="Main office")
+    
     latitude = Column(Float,nullable=False)
     
     longitude = Column(Float,nullable=False)
@@ -92,9 +115,9 @@ class OfficeLocation(Base):
     resolved_address = Column(String,nullable=False)
     
     radius_meter = Column(Float,default = 100)
-    company_id = Column(Integer, ForeignKey("companies.id")) 
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True) 
     
-    company = relationship("Company", back_populates="office_location")
+    company = relationship("Company", back_populates="office_locations")
     
 class UserImage(Base):
     
@@ -102,11 +125,29 @@ class UserImage(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     image_path = Column(String,nullable = False)
-    user_id = Column(Integer,ForeignKey("users.id"),nullable=False) 
+    user_id = Column(Integer,ForeignKey("users.id"),nullable=False,index=True) 
+    
+    # float32 face embedding computed at upload time, tagged with the model that produced it
+    embedding = Column(LargeBinary,nullable = True)
+    embedding_model = Column(String,nullable = True)
     
     user = relationship("User", back_populates="images")  
     
 
+class FaceTemplate(Base):
+    
+    # Aggregated embedding(s) of a user's enrolled photos, rebuilt on every upload
+    __tablename__ = "face_templates"
+    id = Column(Integer, primary_key=True, index=True)
+    
+    user_id = Column(Integer,ForeignKey("users.id"),nullable=False,index=True)
+    embedding = Column(LargeBinary,nullable = False)
+    embedding_model = Column(String,nullable = False)
+    photo_count = Column(Integer,default = 0)
+    
+    user = relationship("User", back_populates="face_templates")
+    
+
 class Company(Base):
     __tablename__ = "companies"
 
@@ -114,9 +155,11 @@ class Company(Base):
     name = Column(String, nullable=False, unique=True)
     email_domain = Column(String, nullable=False, unique=True)  # e.g., techcorp.com
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Employees without a check-in by this local time are marked Absent (None: ABSENTEE_DEFAULT_CUTOFF)
+    absentee_cutoff = Column(Time, nullable=True)
 
     users = relationship("User", back_populates="company", cascade="all, delete-orphan")
-    office_location = relationship("OfficeLocation", back_populates="company", uselist=False)
+    office_locations = relationship("OfficeLocation", back_populates="company")
 
     
 class Growth(Base):
@@ -131,6 +174,7 @@ class Growth(Base):
 
 class Skills(Base):
     __tablename__ = "skills"
+    __table_args__ = (Index("ix_skills_user_id_status", "user_id", "status"),)
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -139,4 +183,25 @@ class Skills(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     user = relationship("User", back_populates="skills")
-    
\ No newline at end of file
+
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    
+    # Reverse-geocoded address per snapped coordinate cell, shared by all workers
+    cell = Column(String, primary_key=True)
+    address = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    
+    # One row per scheduled job execution; the leader reads it to catch up after downtime
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, nullable=False, index=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String, nullable=False, default="running")
+    rows = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
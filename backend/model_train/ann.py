@@ -0,0 +1,121 @@
+import os
+import numpy as np
+
+
+def spherical_kmeans(rows, k, iterations=10, seed=0):
+    # k-means on L2-normalised rows using cosine similarity; returns normalised centroids
+    rng = np.random.default_rng(seed)
+    centroids = rows[rng.choice(len(rows), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(rows @ centroids.T, axis=1)
+        for cell in range(k):
+            members = rows[labels == cell]
+            if len(members):
+                centroids[cell] = members.mean(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+class ExactIndex:
+    # Reference mode: every gallery row is scored
+
+    def assign(self, rows):
+        return np.zeros(len(rows), dtype=np.int32)
+
+    def build_lists(self, assignments):
+        return None
+
+    def candidates(self, probe, lists):
+        return None
+
+    def needs_training(self, size):
+        return False
+
+    def train(self, matrix):
+        pass
+
+    def save(self, path):
+        pass
+
+
+class IVFIndex:
+    # Inverted-file index: spherical k-means splits the gallery into nlist cells
+    # and a search only scores rows in the nprobe cells closest to the probe.
+    # nprobe is the recall-vs-latency knob (nprobe == nlist is exact search).
+
+    def __init__(self, nlist=0, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+
+    def needs_training(self, size):
+        if size < 2:
+            return False
+        # Retrain once the gallery has doubled since the centroids were fitted
+        return self.centroids is None or size > 2 * max(self.trained_size, 1)
+
+    def train(self, matrix):
+        if len(matrix) < 2:
+            return
+        nlist = self.nlist or int(np.sqrt(len(matrix)))
+        nlist = max(1, min(nlist, len(matrix)))
+        rng = np.random.default_rng(self.seed)
+
+        # Fitting on a sample keeps training time flat for very large galleries
+        sample_size = min(len(matrix), nlist * 256)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, nlist, self.iterations, self.seed)
+        self.trained_size = len(matrix)
+
+    def assign(self, rows):
+        if self.centroids is None or len(rows) == 0:
+            return np.zeros(len(rows), dtype=np.int32)
+        return np.argmax(rows @ self.centroids.T, axis=1).astype(np.int32)
+
+    def build_lists(self, assignments):
+        # Row positions grouped by cell: order[offsets[c]:offsets[c + 1]] belong to cell c
+        if self.centroids is None:
+            return None
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        return order, offsets
+
+    def candidates(self, probe, lists):
+        if lists is None:
+            return None
+        order, offsets = lists
+        nprobe = min(self.nprobe, len(self.centroids))
+        if nprobe >= len(self.centroids):
+            return None
+        cells = np.argpartition(-(self.centroids @ probe), nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in cells])
+
+    def save(self, path):
+        if self.centroids is None:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, centroids=self.centroids, trained_size=self.trained_size)
+
+    def load(self, path, dim):
+        if not os.path.exists(path):
+            return False
+        data = np.load(path)
+        if data["centroids"].shape[1] != dim:
+            return False
+        self.centroids = data["centroids"].astype(np.float32)
+        self.trained_size = int(data["trained_size"])
+        return True
+
+
+def create_index(kind, nlist=0, nprobe=8, path=None, dim=512):
+    if kind == "exact":
+        return ExactIndex()
+    if kind == "ivf":
+        index = IVFIndex(nlist=nlist, nprobe=nprobe)
+        if path:
+            index.load(path, dim)
+        return index
+    raise ValueError(f"Unknown face index: {kind}")
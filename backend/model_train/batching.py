@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+
+class BatchMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.batch_sizes = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def record(self, waits, run_time):
+        with self._lock:
+            self.batches += 1
+            self.items += len(waits)
+            self.max_batch_size = max(self.max_batch_size, len(waits))
+            self.batch_sizes[len(waits)] = self.batch_sizes.get(len(waits), 0) + 1
+            self.total_wait += sum(waits)
+            self.max_wait = max(self.max_wait, max(waits))
+            self.total_run += run_time
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "avg_queue_wait_ms": round(self.total_wait / self.items * 1000, 2) if self.items else 0.0,
+                "max_queue_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_batch_run_ms": round(self.total_run / self.batches * 1000, 2) if self.batches else 0.0,
+            }
+
+
+class InferenceBatcher:
+    # Collects concurrent submit() calls for up to max_wait_ms (or until
+    # max_batch_size items are queued), runs run_batch(items) once in a worker
+    # thread and hands each caller its own result. Up to `workers` batches run
+    # at the same time.
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=10, executor=None, workers=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.workers = workers
+        self.metrics = BatchMetrics()
+        self._queue = None
+        self._tasks = []
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        if not self._tasks or any(task.done() for task in self._tasks):
+            for task in self._tasks:
+                task.cancel()
+            self._queue = asyncio.Queue()
+            self._tasks = [loop.create_task(self._run()) for _ in range(self.workers)]
+
+        future = loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            waits = [started - queued_at for _, _, queued_at in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, [item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.metrics.record(waits, time.perf_counter() - started)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
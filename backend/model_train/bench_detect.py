@@ -0,0 +1,39 @@
+# Face detection latency vs input resolution.
+#
+#   python -m model_train.bench_detect path/to/photo.jpg [repeats]
+#
+# Detects on the photo resized to several longest-side sizes and prints the
+# mean MTCNN time and the number of faces found at each size.
+import sys
+import time
+
+from model_train.face_recog import get_models, read_image
+from model_train.preprocess import downscale
+
+SIDES = [4000, 3000, 2000, 1280, 960, 640, 480, 320]
+
+
+def bench(image_path, repeats=5):
+    img = read_image(image_path)
+    if img is None:
+        raise SystemExit(f"Cannot read {image_path}")
+    _, mtcnn, _ = get_models()
+
+    print(f"{'max side':>8} {'pixels':>10} {'detect ms':>10} {'faces':>6}")
+    for side in SIDES:
+        if side > max(img.shape[:2]):
+            continue
+        small, _ = downscale(img, side)
+        mtcnn.detect(small)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            boxes, _ = mtcnn.detect(small)
+        elapsed = (time.perf_counter() - started) / repeats * 1000
+        faces = 0 if boxes is None else len(boxes)
+        print(f"{side:>8} {small.shape[0] * small.shape[1]:>10} {elapsed:>10.1f} {faces:>6}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python -m model_train.bench_detect IMAGE [REPEATS]")
+    bench(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,44 @@
+# Sustained streaming throughput on this host.
+#
+#   python -m model_train.bench_stream path/to/video.mp4 [max_frames]
+#
+# Feeds the video's frames through the same detect + track + embed-once
+# pipeline as the /attendance/stream WebSocket (without DB matching) and
+# prints the sustained frames/sec.
+import sys
+import time
+
+import cv2
+
+from model_train.face_recog import warm_up
+from model_train.stream import StreamSession
+
+
+def bench(video_path, max_frames=300):
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise SystemExit(f"Cannot open {video_path}")
+    warm_up()
+
+    session = StreamSession()
+    frames = 0
+    started = time.perf_counter()
+    while frames < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        session.process_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        frames += 1
+    elapsed = time.perf_counter() - started
+    capture.release()
+
+    print(f"frames:          {frames}")
+    print(f"tracks embedded: {session.embedded}")
+    print(f"elapsed:         {elapsed:.2f}s")
+    print(f"sustained fps:   {frames / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python -m model_train.bench_stream VIDEO [MAX_FRAMES]")
+    bench(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 300)
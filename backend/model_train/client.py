@@ -0,0 +1,83 @@
+import socket
+from contextlib import contextmanager
+import numpy as np
+from model_train.ipc import send_message, recv_message, share_bytes
+
+
+class InferenceClient:
+    # Thin client used by web workers when FACE_SERVER_SOCKET is set: the
+    # inference server process owns the models and galleries.
+
+    def __init__(self, socket_path, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def call(self, message):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, message)
+            reply = recv_message(sock)
+        if "error" in reply:
+            raise RuntimeError(f"Inference server error: {reply['error']}")
+        return reply
+
+    def embed(self, blobs):
+        segments = [share_bytes(data) for data in blobs]
+        try:
+            reply = self.call({
+                "op": "embed",
+                "images": [{"shm": seg.name, "size": len(data)} for seg, data in zip(segments, blobs)],
+            })
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        return [None if e is None else np.asarray(e, dtype=np.float32) for e in reply["embeddings"]]
+
+    @contextmanager
+    def shared_image(self, data):
+        # One copy of the photo for several calls, e.g. detect then embed_boxes
+        segment = share_bytes(data)
+        try:
+            yield {"shm": segment.name, "size": len(data)}
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def embed_all(self, data):
+        with self.shared_image(data) as image:
+            reply = self.call({"op": "embed_all", "image": image})
+        return [np.asarray(e, dtype=np.float32) for e in reply["embeddings"]]
+
+    def detect(self, image, max_side):
+        # (boxes, probs) of a shared image, or None when it can't be decoded
+        reply = self.call({"op": "detect", "image": image, "max_side": max_side})
+        if not reply["decoded"]:
+            return None
+        return reply["boxes"], reply["probs"]
+
+    def embed_boxes(self, image, boxes):
+        reply = self.call({"op": "embed_boxes", "image": image, "boxes": to_list(boxes)})
+        return [np.asarray(e, dtype=np.float32) for e in reply["embeddings"]]
+
+    def recognize(self, embedding, company_id):
+        reply = self.call({"op": "recognize", "embedding": to_list(embedding), "company_id": company_id})
+        return reply["name"], reply["confidence"]
+
+    def verify(self, embedding, user_id):
+        reply = self.call({"op": "verify", "embedding": to_list(embedding), "user_id": user_id})
+        return reply["accepted"], reply["confidence"]
+
+    def rebuild_templates(self, user_id):
+        return self.call({"op": "rebuild_templates", "user_id": user_id})["templates"]
+
+    def invalidate(self, company_id):
+        self.call({"op": "invalidate", "company_id": company_id})
+
+    def metrics(self):
+        return self.call({"op": "metrics"})["metrics"]
+
+
+def to_list(embedding):
+    return None if embedding is None else np.asarray(embedding, dtype=np.float32).tolist()
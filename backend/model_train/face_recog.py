@@ -1,58 +1,485 @@
-from model import User, UserImage
+from model import User, UserImage, FaceTemplate
+from config import (
+    FACE_MODEL_WEIGHTS, FACE_MATCH_THRESHOLD, FACE_GALLERY_TTL, FACE_GALLERY_MEMORY_MB,
+    FACE_INDEX, FACE_IVF_NLIST, FACE_IVF_NPROBE, FACE_INDEX_PATH,
+    FACE_BATCH_MAX_SIZE, FACE_BATCH_MAX_WAIT_MS,
+    FACE_INFERENCE_WORKERS, FACE_INFERENCE_QUEUE_LIMIT, FACE_RETRY_AFTER,
+    FACE_INFERENCE_MODE, FACE_TORCH_THREADS, FACE_CHANNELS_LAST, FACE_OPTIMIZED_TOLERANCE,
+    FACE_DETECT_MAX_SIDE, FACE_GROUP_DETECT_MAX_SIDE, FACE_MIN_IMAGE_SIDE, FACE_MIN_SHARPNESS,
+    FACE_MATCH_MODE, FACE_TEMPLATES_PER_USER, FACE_TEMPLATE_OUTLIER_DISTANCE, FACE_RERANK_CANDIDATES,
+    FACE_SERVER_SOCKET,
+)
+from model_train.gallery import FaceGallery, GalleryCache, normalize
+from model_train.ann import create_index
+from model_train.templates import build_templates
+from model_train.batching import InferenceBatcher
+from model_train.inference_pool import InferencePool
+from model_train.client import InferenceClient
+from model_train.preprocess import downscale, rejection_reason, scale_boxes
+from model_train.optimize import optimize_resnet, sample_faces, embedding_drift, time_per_image
 import os
+import time
+import asyncio
+import threading
 import cv2
-import torch
 import numpy as np
-from facenet_pytorch import InceptionResnetV1, MTCNN
-from scipy.spatial.distance import cosine
 
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-mtcnn = MTCNN(image_size=160, margin=0, min_face_size=40, device=device)
-resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+# Stored embeddings are only reused when they were produced by this exact model
+EMBEDDING_MODEL = f"InceptionResnetV1-{FACE_MODEL_WEIGHTS}"
 
-def get_embedding(image_path):
+# With FACE_SERVER_SOCKET set, models and galleries live in the shared inference
+# server (model_train/server.py) and this module forwards to it
+client = InferenceClient(FACE_SERVER_SOCKET) if FACE_SERVER_SOCKET else None
+
+# torch / facenet_pytorch are imported and the weights loaded on first use, so
+# workers that never serve attendance don't pay for them
+models = None
+models_lock = threading.Lock()
+
+def load_models():
+    import torch
+    from facenet_pytorch import InceptionResnetV1, MTCNN
+
+    started = time.perf_counter()
+    if FACE_TORCH_THREADS:
+        torch.set_num_threads(FACE_TORCH_THREADS)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    mtcnn = MTCNN(image_size=160, margin=0, min_face_size=40, device=device)
+    resnet = InceptionResnetV1(pretrained=FACE_MODEL_WEIGHTS).eval().to(device)
+    if device.type == 'cpu' and (FACE_INFERENCE_MODE != "eager" or FACE_CHANNELS_LAST):
+        resnet = load_optimized_resnet(resnet)
+    print(f"Face models loaded on {device} in {time.perf_counter() - started:.2f}s")
+    return device, mtcnn, resnet
+
+def load_optimized_resnet(reference):
+    # Stored embeddings come from the eager model, so an optimized model is only
+    # used if its embeddings stay within FACE_OPTIMIZED_TOLERANCE of the reference
+    optimized = optimize_resnet(reference, FACE_INFERENCE_MODE, FACE_CHANNELS_LAST)
+    faces = sample_faces(4, FACE_CHANNELS_LAST)
+    drift = embedding_drift(reference, optimized, faces)
+    if drift > FACE_OPTIMIZED_TOLERANCE:
+        print(f"{FACE_INFERENCE_MODE} face model drifts {drift:.4f} from reference, using eager model")
+        return reference
+
+    print(
+        f"Using {FACE_INFERENCE_MODE} face model (drift {drift:.4f}): "
+        f"{time_per_image(reference, faces):.1f} -> {time_per_image(optimized, faces):.1f} ms/image"
+    )
+    return optimized
+
+def get_models():
+    global models
+    if models is None:
+        with models_lock:
+            if models is None:
+                models = load_models()
+    return models
+
+def warm_up():
+    # Load the weights and run one dummy forward pass so the first check-in isn't slow
+    if client is not None:
+        return
+
+    import torch
+    device, mtcnn, resnet = get_models()
+    started = time.perf_counter()
+    mtcnn(np.zeros((160, 160, 3), dtype=np.uint8))
+    with torch.no_grad():
+        resnet(torch.zeros((1, 3, 160, 160), device=device))
+    print(f"Face models warmed up in {time.perf_counter() - started:.2f}s")
+
+def read_image(image_path):
     img = cv2.imread(image_path)
     if img is None:
         return None
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    face = mtcnn(img_rgb)
-    if face is not None:
-        face = face.unsqueeze(0).to(device)
-        with torch.no_grad():
-            embedding = resnet(face).cpu().numpy()[0]
-        return embedding
-    return None
-
-def recognize_user(input_image_path, db, threshold=0.4):
-    users = db.query(User).all()
-    best_match = None
-    lowest_distance = float("inf")
-
-    input_embedding = get_embedding(input_image_path)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def detect_faces(images, max_side=FACE_DETECT_MAX_SIDE, with_probs=False):
+    # Run MTCNN on copies downscaled to max_side (pyramid cost grows with
+    # pixel count) and return each image's boxes in original-resolution pixels,
+    # largest first. Images failing the size/blur checks are skipped (None).
+    _, mtcnn, _ = get_models()
+    boxes = [None] * len(images)
+    probs = [None] * len(images)
+    by_shape = {}
+    scales = {}
+    for i, img in enumerate(images):
+        reason = rejection_reason(img, FACE_MIN_IMAGE_SIDE, FACE_MIN_SHARPNESS)
+        if reason:
+            print(f"Skipping image: {reason}")
+            continue
+        small, scales[i] = downscale(img, max_side)
+        by_shape.setdefault(small.shape, []).append((i, small))
+
+    for group in by_shape.values():
+        detected, detected_probs = mtcnn.detect([small for _, small in group])
+        for (i, _), image_boxes, image_probs in zip(group, detected, detected_probs):
+            boxes[i] = scale_boxes(image_boxes, scales[i])
+            probs[i] = image_probs
+    return (boxes, probs) if with_probs else boxes
+
+def embed_faces(faces):
+    # One InceptionResnetV1 forward pass over a list of cropped face tensors
+    import torch
+
+    device, _, resnet = get_models()
+    batch = torch.stack(faces).to(device)
+    if FACE_CHANNELS_LAST:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        return resnet(batch).cpu().numpy()
+
+def crop_faces(img, boxes):
+    # Crop every detected face the same way MTCNN crops its single best face
+    from facenet_pytorch import fixed_image_standardization
+    from facenet_pytorch.models.utils.detect_face import extract_face
+
+    _, mtcnn, _ = get_models()
+    return [fixed_image_standardization(extract_face(img, box, mtcnn.image_size, mtcnn.margin)) for box in boxes]
+
+def embed_images(images):
+    # Detect on downscaled copies, crop the largest face from the full-resolution
+    # image and embed all crops in a single batch. Returns an embedding or None per image.
+    _, mtcnn, _ = get_models()
+    faces = [None] * len(images)
+    for i, image_boxes in enumerate(detect_faces(images)):
+        if image_boxes is not None and len(image_boxes):
+            faces[i] = mtcnn.extract(images[i], image_boxes[:1], None)
+
+    found = [i for i, face in enumerate(faces) if face is not None]
+    embeddings = [None] * len(images)
+    if not found:
+        return embeddings
+
+    for i, embedding in zip(found, embed_faces([faces[i] for i in found])):
+        embeddings[i] = embedding
+    return embeddings
+
+def decode_image(data):
+    # Decode an uploaded photo straight from the request bytes
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def read_file(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def embed_image_paths(image_paths):
+    if client is None:
+        return embed_images([read_image(path) for path in image_paths])
+    # The server decodes the photos itself, so only their bytes are sent
+    blobs = [read_file(path) for path in image_paths]
+    found = [i for i, data in enumerate(blobs) if data]
+    embeddings = [None] * len(blobs)
+    if found:
+        for i, embedding in zip(found, client.embed([blobs[i] for i in found])):
+            embeddings[i] = embedding
+    return embeddings
+
+def embed_image_bytes(blobs):
+    if client is not None:
+        return client.embed(blobs)
+    return embed_images([decode_image(data) for data in blobs])
+
+def embed_all_faces(data):
+    # Every face in one photo, embedded in a single forward pass
+    if client is not None:
+        return client.embed_all(data)
+    img = decode_image(data)
+    boxes = detect_faces([img], FACE_GROUP_DETECT_MAX_SIDE)[0]
+    if boxes is None or len(boxes) == 0:
+        return []
+    return list(embed_faces(crop_faces(img, boxes)))
+
+def get_embedding(image_path):
+    return embed_image_paths([image_path])[0]
+
+# Concurrent check-ins share detection/embedding calls, run on dedicated threads
+inference_pool = InferencePool(FACE_INFERENCE_WORKERS, FACE_INFERENCE_QUEUE_LIMIT, FACE_RETRY_AFTER)
+batcher = InferenceBatcher(
+    embed_image_bytes, FACE_BATCH_MAX_SIZE, FACE_BATCH_MAX_WAIT_MS,
+    executor=inference_pool.executor, workers=FACE_INFERENCE_WORKERS,
+)
+
+async def get_embedding_async(image_bytes):
+    # Raises InferenceBusy when too many check-ins are already queued
+    with inference_pool.slot():
+        return await batcher.submit(image_bytes)
+
+async def run_inference_async(fn, *args):
+    # Other inference work (group photos, enrollment) on the same threads and admission limit
+    with inference_pool.slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(inference_pool.executor, fn, *args)
+
+async def get_group_embeddings_async(image_bytes):
+    return await run_inference_async(embed_all_faces, image_bytes)
+
+def inference_metrics():
+    gallery_metrics = client.metrics() if client is not None else galleries.snapshot()
+    return {**batcher.metrics.snapshot(), **inference_pool.snapshot(), **gallery_metrics}
+
+def embedding_to_bytes(embedding):
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def embedding_from_bytes(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+def store_embeddings(user_images):
+    # Compute the embeddings for enrolled images in one batch and keep them on the rows.
+    # A row with embedding_model set but no embedding means no face was found.
+    embeddings = embed_image_paths([user_image.image_path for user_image in user_images])
+    for user_image, embedding in zip(user_images, embeddings):
+        user_image.embedding = embedding_to_bytes(embedding) if embedding is not None else None
+        user_image.embedding_model = EMBEDDING_MODEL
+    return embeddings
+
+def store_embedding(user_image):
+    return store_embeddings([user_image])[0]
+
+def load_embedding(user_image):
+    # Returns (embedding, backfilled)
+    if user_image.embedding_model == EMBEDDING_MODEL:
+        if user_image.embedding is None:
+            return None, False
+        return embedding_from_bytes(user_image.embedding), False
+
+    # Missing or produced by another model version: recompute once and persist
+    if not os.path.exists(user_image.image_path):
+        return None, False
+    return store_embedding(user_image), True
+
+def rebuild_user_templates(user_id, db):
+    # Enrollment-time aggregation of a user's photo embeddings into FaceTemplate rows
+    if client is not None:
+        # Stale embeddings are recomputed on the server, which writes the templates
+        # itself; commit the user's images first
+        client.rebuild_templates(user_id)
+        return []
+
+    embeddings = []
+    backfilled = False
+    for ref in db.query(UserImage).filter(UserImage.user_id == user_id).all():
+        embedding, updated = load_embedding(ref)
+        backfilled = backfilled or updated
+        if embedding is not None:
+            embeddings.append(embedding)
+
+    db.query(FaceTemplate).filter(FaceTemplate.user_id == user_id).delete(synchronize_session=False)
+    templates = []
+    if embeddings:
+        centroids, kept = build_templates(embeddings, FACE_TEMPLATES_PER_USER, FACE_TEMPLATE_OUTLIER_DISTANCE)
+        if not kept.all():
+            print(f"Dropped {int((~kept).sum())} outlier photo(s) from user {user_id}'s template")
+        for centroid in centroids:
+            template = FaceTemplate(
+                user_id=user_id,
+                embedding=embedding_to_bytes(centroid),
+                embedding_model=EMBEDDING_MODEL,
+                photo_count=int(kept.sum()),
+            )
+            db.add(template)
+            templates.append(template)
+    if templates or backfilled:
+        db.flush()
+    return templates
+
+def backfill_templates(db, company_id):
+    # Users enrolled before templates existed (or under another model version)
+    current = db.query(FaceTemplate.user_id).filter(FaceTemplate.embedding_model == EMBEDDING_MODEL)
+    missing = (
+        db.query(UserImage.user_id)
+        .join(User, UserImage.user_id == User.id)
+        .filter(User.company_id == company_id, ~UserImage.user_id.in_(current))
+        .distinct()
+        .all()
+    )
+    for (user_id,) in missing:
+        rebuild_user_templates(user_id, db)
+    if missing:
+        db.commit()
+
+# Galleries are partitioned per company: key (company_id, kind) where "raw"
+# holds every enrolled photo and "template" the per-user centroids
+galleries = GalleryCache(FACE_GALLERY_MEMORY_MB * 1024 * 1024, FACE_GALLERY_TTL)
+
+def index_path(company_id, kind):
+    root, ext = os.path.splitext(FACE_INDEX_PATH)
+    return f"{root}_{company_id}_{kind}{ext}"
+
+def gallery_rows(db, company_id, kind):
+    # (user_id, name, row_id, embedding) for every row of one company's gallery
+    if kind == "template":
+        backfill_templates(db, company_id)
+        rows = (
+            db.query(FaceTemplate, User.name)
+            .join(User, FaceTemplate.user_id == User.id)
+            .filter(User.company_id == company_id, FaceTemplate.embedding_model == EMBEDDING_MODEL)
+            .all()
+        )
+        return [(t.user_id, name, t.id, embedding_from_bytes(t.embedding)) for t, name in rows]
+
+    result = []
+    backfilled = False
+    rows = db.query(UserImage, User.name).join(User, UserImage.user_id == User.id).filter(User.company_id == company_id)
+    for ref, name in rows.all():
+        embedding, updated = load_embedding(ref)
+        backfilled = backfilled or updated
+        if embedding is not None:
+            result.append((ref.user_id, name, ref.id, embedding))
+    if backfilled:
+        db.commit()
+    return result
+
+def load_gallery(db, company_id, kind="raw"):
+    path = index_path(company_id, kind)
+    index = create_index(FACE_INDEX, FACE_IVF_NLIST, FACE_IVF_NPROBE, path)
+    new_gallery = FaceGallery(index=index)
+    rows = gallery_rows(db, company_id, kind)
+    if rows:
+        user_ids, names, row_ids, embeddings = zip(*rows)
+        new_gallery.add_many(user_ids, names, row_ids, embeddings)
+    if index.needs_training(len(new_gallery)):
+        new_gallery.rebuild_index(path)
+    return new_gallery
+
+def get_gallery(db, company_id, kind="raw"):
+    # Loaded on the company's first check-in, then kept under the LRU memory budget
+    return galleries.get((company_id, kind), lambda: load_gallery(db, company_id, kind))
+
+def add_to_gallery(user_image, user):
+    # Called after enrollment; skipped until the company's gallery is first needed.
+    # With a server, replace_user_templates invalidates once for the whole upload
+    if client is not None:
+        return
+    raw = galleries.peek((user.company_id, "raw"))
+    if raw is None or user_image.embedding is None:
+        return
+    raw.add(user_image.user_id, user.name, user_image.id, embedding_from_bytes(user_image.embedding))
+
+def replace_user_templates(user, templates):
+    if client is not None:
+        client.invalidate(user.company_id)
+        return
+    user_id, user_name = user.id, user.name
+    template_gallery = galleries.peek((user.company_id, "template"))
+    if template_gallery is None:
+        return
+    template_gallery.remove_user(user_id)
+    if templates:
+        template_gallery.add_many(
+            [user_id] * len(templates), [user_name] * len(templates),
+            [t.id for t in templates], [embedding_from_bytes(t.embedding) for t in templates],
+        )
+
+def remove_from_gallery(user):
+    if client is not None:
+        client.invalidate(user.company_id)
+        return
+    for kind in ("raw", "template"):
+        loaded = galleries.peek((user.company_id, kind))
+        if loaded is not None:
+            loaded.remove_user(user.id)
+
+def recognize_embedding(input_embedding, company_id, db, threshold=FACE_MATCH_THRESHOLD):
+    # 1:N search restricted to one company's employees
     if input_embedding is None:
         print("No face detected in input image.")
-        return None, None, 0.0
+        return None, 0.0
+    if client is not None:
+        return client.recognize(input_embedding, company_id)
+
+    if FACE_MATCH_MODE == "raw":
+        return get_gallery(db, company_id, "raw").match(input_embedding, threshold)
+
+    template_gallery = get_gallery(db, company_id, "template")
+    if FACE_MATCH_MODE == "centroid":
+        return template_gallery.match(input_embedding, threshold)
+
+    # rerank: shortlist users by template, then score their individual photos
+    shortlist = [user_id for user_id, _ in template_gallery.search(input_embedding, k=FACE_RERANK_CANDIDATES)]
+    best_user, best_similarity = None, -1.0
+    for user_id, references in shortlist_references(shortlist, company_id, db).items():
+        similarity = float(np.max(references @ normalize(input_embedding)))
+        if similarity > best_similarity:
+            best_user, best_similarity = user_id, similarity
+    if best_user is not None and 1 - best_similarity < threshold:
+        return template_gallery.names.get(best_user), best_similarity * 100
+    return None, 0.0
 
-    for user in users:
-        ref_images = db.query(UserImage).filter(UserImage.user_id == user.id).all()
+def recognize_group(embeddings, company_id, db, threshold=FACE_MATCH_THRESHOLD):
+    # [(name, confidence)] for each recognized face, best score per person
+    best = {}
+    for embedding in embeddings:
+        name, confidence = recognize_embedding(embedding, company_id, db, threshold)
+        if name and confidence > best.get(name, 0.0):
+            best[name] = confidence
+    return list(best.items())
 
-        for ref in ref_images:
-            ref_image_path = ref.image_path
-            if not os.path.exists(ref_image_path):
-                continue
+def recognize_user(input_image_path, company_id, db, threshold=FACE_MATCH_THRESHOLD):
+    return recognize_embedding(get_embedding(input_image_path), company_id, db, threshold)
 
-            ref_embedding = get_embedding(ref_image_path)
-            if ref_embedding is None:
-                continue
+def shortlist_references(user_ids, company_id, db, kind="raw"):
+    # {user_id: normalized embeddings}. Users the resident gallery doesn't hold
+    # are read together in one IN (...) query rather than a query per user.
+    references = {}
+    loaded = galleries.peek((company_id, kind))
+    if loaded is not None:
+        for user_id in user_ids:
+            found = loaded.user_embeddings(user_id)
+            if len(found):
+                references[user_id] = found
 
-            distance = cosine(input_embedding, ref_embedding)
-            if distance < lowest_distance:
-                best_match = user
-                lowest_distance = distance
+    missing = [user_id for user_id in user_ids if user_id not in references]
+    if not missing:
+        return references
 
-    if best_match and lowest_distance < threshold:
-        recognized_user = best_match.name
-        confidence = float((1 - lowest_distance)*100)  # simple inverse
-        return recognized_user, confidence
+    by_user = {}
+    if kind == "template":
+        rows = db.query(FaceTemplate).filter(
+            FaceTemplate.user_id.in_(missing), FaceTemplate.embedding_model == EMBEDDING_MODEL
+        ).all()
+        for t in rows:
+            by_user.setdefault(t.user_id, []).append(embedding_from_bytes(t.embedding))
     else:
-        return None, 0.0
+        backfilled = False
+        for ref in db.query(UserImage).filter(UserImage.user_id.in_(missing)).all():
+            embedding, updated = load_embedding(ref)
+            backfilled = backfilled or updated
+            if embedding is not None:
+                by_user.setdefault(ref.user_id, []).append(embedding)
+        if backfilled:
+            db.commit()
+    references.update((user_id, normalize(embeddings)) for user_id, embeddings in by_user.items())
+    return references
+
+def user_references(user_id, company_id, db, kind="raw"):
+    references = shortlist_references([user_id], company_id, db, kind)
+    return references.get(user_id, np.empty((0, 512), dtype=np.float32))
+
+def verify_embedding(input_embedding, user, db, threshold=FACE_MATCH_THRESHOLD):
+    # 1:1 check of the probe against one user's enrolled photos -> (accepted, confidence)
+    if input_embedding is None:
+        print("No face detected in input image.")
+        return False, 0.0
+    if client is not None:
+        return client.verify(input_embedding, user.id)
+
+    references = np.empty((0, 512), dtype=np.float32)
+    if FACE_MATCH_MODE == "centroid":
+        references = user_references(user.id, user.company_id, db, "template")
+    if len(references) == 0:
+        references = user_references(user.id, user.company_id, db)
+    if len(references) == 0:
+        return False, 0.0
+
+    similarity = float(np.max(references @ normalize(input_embedding)))
+    return 1 - similarity < threshold, similarity * 100
+
+def verify_user(input_image_path, user, db, threshold=FACE_MATCH_THRESHOLD):
+    return verify_embedding(get_embedding(input_image_path), user, db, threshold)
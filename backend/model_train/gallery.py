@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from model_train.ann import ExactIndex
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class FaceGallery:
+    # All enrolled embeddings as one contiguous float32 matrix, L2-normalised so
+    # cosine similarity is a single matrix-vector product. Rows line up with
+    # user_ids / image_ids. Writers swap in new arrays under a lock so searches
+    # always see a consistent snapshot without locking.
+
+    def __init__(self, dim=512, index=None):
+        self.dim = dim
+        self.names = {}
+        self.index = index or ExactIndex()
+        self._lock = threading.Lock()
+        # (matrix, user_ids, image_ids, index cell per row, index inverted lists)
+        self._data = (
+            np.empty((0, dim), dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            None,
+        )
+
+    def __len__(self):
+        return len(self._data[1])
+
+    @property
+    def matrix(self):
+        return self._data[0]
+
+    @property
+    def user_ids(self):
+        return self._data[1]
+
+    @property
+    def image_ids(self):
+        return self._data[2]
+
+    def _swap(self, matrix, users, images, cells):
+        self._data = (matrix, users, images, cells, self.index.build_lists(cells))
+
+    def add_many(self, user_ids, names, image_ids, embeddings):
+        if len(user_ids) == 0:
+            return
+        rows = normalize(np.asarray(embeddings).reshape(len(user_ids), self.dim))
+        with self._lock:
+            matrix, users, images, cells, _ = self._data
+            # Re-uploading an image replaces its previous row
+            keep = ~np.isin(images, image_ids)
+            self._swap(
+                np.ascontiguousarray(np.vstack([matrix[keep], rows])),
+                np.concatenate([users[keep], np.asarray(user_ids, dtype=np.int64)]),
+                np.concatenate([images[keep], np.asarray(image_ids, dtype=np.int64)]),
+                np.concatenate([cells[keep], self.index.assign(rows)]),
+            )
+            self.names.update(zip(user_ids, names))
+
+    def add(self, user_id, name, image_id, embedding):
+        self.add_many([user_id], [name], [image_id], [embedding])
+
+    def remove_images(self, image_ids):
+        with self._lock:
+            matrix, users, images, cells, _ = self._data
+            keep = ~np.isin(images, list(image_ids))
+            self._swap(matrix[keep], users[keep], images[keep], cells[keep])
+
+    def remove_user(self, user_id):
+        with self._lock:
+            matrix, users, images, cells, _ = self._data
+            keep = users != user_id
+            self._swap(matrix[keep], users[keep], images[keep], cells[keep])
+            self.names.pop(user_id, None)
+
+    def rebuild_index(self, path=None):
+        # Refit the index on the current rows, optionally persisting it
+        with self._lock:
+            matrix, users, images, _, _ = self._data
+            self.index.train(matrix)
+            self._swap(matrix, users, images, self.index.assign(matrix))
+        if path:
+            self.index.save(path)
+
+    def user_embeddings(self, user_id):
+        matrix, users, _, _, _ = self._data
+        return matrix[users == user_id]
+
+    def search(self, probe, k=1):
+        # Returns up to k (user_id, similarity) pairs, best photo per user
+        matrix, users, _, _, lists = self._data
+        if len(users) == 0:
+            return []
+        probe = normalize(probe).reshape(self.dim)
+        rows = self.index.candidates(probe, lists)
+        if rows is not None:
+            if len(rows) == 0:
+                return []
+            matrix, users = matrix[rows], users[rows]
+        scores = matrix @ probe
+        if k == 1:
+            best = int(np.argmax(scores))
+            return [(int(users[best]), float(scores[best]))]
+
+        results = []
+        seen = set()
+        for row in np.argsort(-scores):
+            user_id = int(users[row])
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            results.append((user_id, float(scores[row])))
+            if len(results) == k:
+                break
+        return results
+
+    def match(self, probe, threshold):
+        # Same (name, confidence) contract as recognize_user; threshold is a cosine distance
+        results = self.search(probe, k=1)
+        if not results:
+            return None, 0.0
+        user_id, similarity = results[0]
+        if 1 - similarity < threshold:
+            return self.names.get(user_id), float(similarity * 100)
+        return None, 0.0
+
+    @property
+    def nbytes(self):
+        matrix, users, images, cells, _ = self._data
+        return matrix.nbytes + users.nbytes + images.nbytes + cells.nbytes
+
+
+class GalleryCache:
+    # Galleries keyed by (company_id, kind), loaded on first use and evicted
+    # least-recently-used once their combined size exceeds max_bytes. Entries
+    # older than ttl seconds are reloaded so other workers' uploads show up.
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                return entry[0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the cache lock so one company's load doesn't stall the others
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                    return entry[0]
+            gallery = load()
+            with self._lock:
+                self.loads += 1
+                self._entries[key] = (gallery, time.monotonic())
+                self._entries.move_to_end(key)
+                self._evict()
+            return gallery
+
+    def peek(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self):
+        # Always keep the most recently used gallery, even if it alone is over budget
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def nbytes(self):
+        return sum(gallery.nbytes for gallery, _ in self._entries.values())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "resident_galleries": len(self._entries),
+                "resident_bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
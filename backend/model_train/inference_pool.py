@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class InferenceBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Face inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    # Dedicated threads for CPU-bound face inference plus an admission limit:
+    # at most max_pending requests may be running or waiting for a worker,
+    # anything beyond that is rejected immediately instead of piling up.
+
+    def __init__(self, max_workers=2, max_pending=32, retry_after=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="face-inference")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise InferenceBusy(self.retry_after)
+            self.pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+            }
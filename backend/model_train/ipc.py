@@ -0,0 +1,46 @@
+import json
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+# Messages between the web workers and the inference server are length-prefixed
+# JSON; image bytes travel through shared memory segments named in the message.
+
+HEADER = struct.Struct(">I")
+
+
+def send_message(sock, message):
+    body = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 16))
+        if not chunk:
+            raise ConnectionError("Inference server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    (size,) = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return json.loads(recv_exact(sock, size))
+
+
+def share_bytes(data):
+    segment = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    segment.buf[:len(data)] = data
+    return segment
+
+
+def read_shared(name, size):
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        # The creating process owns the segment; don't let this process's
+        # resource tracker unlink it on exit
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return bytes(segment.buf[:size])
+    finally:
+        segment.close()
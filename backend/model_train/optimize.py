@@ -0,0 +1,59 @@
+import copy
+import time
+
+
+def optimize_resnet(resnet, mode, channels_last=False):
+    # Returns a CPU-tuned copy of the eager InceptionResnetV1.
+    #   eager     - unchanged float32 model
+    #   traced    - TorchScript trace, frozen for inference
+    #   quantized - dynamic int8 quantization of the Linear layers, then traced
+    import torch
+
+    if mode not in ("eager", "traced", "quantized"):
+        raise ValueError(f"Unknown face inference mode: {mode}")
+
+    model = copy.deepcopy(resnet).eval()
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if mode == "eager":
+        return model
+
+    if mode == "quantized":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    example = sample_faces(2, channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+def sample_faces(count, channels_last=False, seed=0):
+    # Deterministic prewhitened-looking inputs in MTCNN's output range
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    faces = torch.randn((count, 3, 160, 160), generator=generator).clamp(-1, 1)
+    if channels_last:
+        faces = faces.contiguous(memory_format=torch.channels_last)
+    return faces
+
+
+def embedding_drift(reference, optimized, faces):
+    # Largest cosine distance between the two models' embeddings of the same faces
+    import torch
+
+    with torch.no_grad():
+        expected = torch.nn.functional.normalize(reference(faces), dim=1)
+        actual = torch.nn.functional.normalize(optimized(faces), dim=1)
+    return float((1 - (expected * actual).sum(dim=1)).max())
+
+
+def time_per_image(model, faces, repeats=5):
+    import torch
+
+    with torch.no_grad():
+        model(faces)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            model(faces)
+    return (time.perf_counter() - started) / (repeats * len(faces)) * 1000
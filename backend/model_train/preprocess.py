@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+
+def downscale(img, max_side):
+    # Shrink so the longest side is at most max_side; returns (image, scale)
+    height, width = img.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return img, 1.0
+    scale = max_side / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def sharpness(img):
+    # Variance of the Laplacian: low values mean a blurry photo
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def rejection_reason(img, min_side=0, min_sharpness=0.0):
+    if img is None:
+        return "unreadable image"
+    if min_side and min(img.shape[:2]) < min_side:
+        return "image too small"
+    if min_sharpness and sharpness(img) < min_sharpness:
+        return "image too blurry"
+    return None
+
+
+def scale_boxes(boxes, scale):
+    # Map boxes detected on the downscaled image back to original pixels
+    if boxes is None or scale == 1.0:
+        return boxes
+    return np.asarray(boxes, dtype=np.float32) / scale
@@ -0,0 +1,112 @@
+# Local inference server shared by all web workers on a host.
+#
+#   FACE_SERVER_SOCKET=/tmp/face.sock python -m model_train.server
+#
+# Start it before the web workers and give them the same FACE_SERVER_SOCKET;
+# it loads the face models and galleries once instead of once per worker.
+import os
+import socketserver
+
+import numpy as np
+
+from config import FACE_SERVER_SOCKET
+from database import SessionLocal
+from model import User
+from model_train import face_recog
+from model_train.ipc import send_message, recv_message, read_shared
+
+
+def handle(message):
+    op = message["op"]
+    if op == "embed":
+        blobs = [read_shared(image["shm"], image["size"]) for image in message["images"]]
+        embeddings = face_recog.embed_image_bytes(blobs)
+        return {"embeddings": [None if e is None else e.tolist() for e in embeddings]}
+
+    if op == "embed_all":
+        image = message["image"]
+        embeddings = face_recog.embed_all_faces(read_shared(image["shm"], image["size"]))
+        return {"embeddings": [e.tolist() for e in embeddings]}
+
+    if op == "detect":
+        # Streaming check-in: the web worker tracks faces and asks for the new ones' embeddings
+        image = message["image"]
+        img = face_recog.decode_image(read_shared(image["shm"], image["size"]))
+        if img is None:
+            return {"decoded": False}
+        boxes, probs = face_recog.detect_faces([img], message["max_side"], with_probs=True)
+        return {"decoded": True, "boxes": to_list(boxes[0]), "probs": to_list(probs[0])}
+
+    if op == "embed_boxes":
+        image = message["image"]
+        img = face_recog.decode_image(read_shared(image["shm"], image["size"]))
+        boxes = np.asarray(message["boxes"], dtype=np.float32)
+        embeddings = face_recog.embed_faces(face_recog.crop_faces(img, boxes))
+        return {"embeddings": [e.tolist() for e in embeddings]}
+
+    if op == "metrics":
+        return {"metrics": face_recog.galleries.snapshot()}
+
+    if op == "invalidate":
+        for kind in ("raw", "template"):
+            face_recog.galleries.discard((message["company_id"], kind))
+        return {}
+
+    embedding = message.get("embedding")
+    if embedding is not None:
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+    db = SessionLocal()
+    try:
+        if op == "recognize":
+            name, confidence = face_recog.recognize_embedding(embedding, message["company_id"], db)
+            return {"name": name, "confidence": confidence}
+        if op == "verify":
+            user = db.query(User).filter(User.id == message["user_id"]).first()
+            if user is None:
+                return {"accepted": False, "confidence": 0.0}
+            accepted, confidence = face_recog.verify_embedding(embedding, user, db)
+            return {"accepted": bool(accepted), "confidence": confidence}
+        if op == "rebuild_templates":
+            templates = face_recog.rebuild_user_templates(message["user_id"], db)
+            db.commit()
+            return {"templates": len(templates)}
+    finally:
+        db.close()
+    raise ValueError(f"Unknown op: {op}")
+
+
+def to_list(values):
+    return None if values is None else np.asarray(values, dtype=np.float32).tolist()
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            reply = handle(recv_message(self.request))
+        except Exception as e:
+            print(f"[Inference server error]: {e}")
+            reply = {"error": str(e)}
+        send_message(self.request, reply)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path):
+    # This process does the work itself rather than forwarding to another server
+    face_recog.client = None
+    face_recog.warm_up()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with Server(socket_path, Handler) as server:
+        print(f"Face inference server listening on {socket_path}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    if not FACE_SERVER_SOCKET:
+        raise SystemExit("Set FACE_SERVER_SOCKET to the socket path to listen on")
+    serve(FACE_SERVER_SOCKET)
@@ -0,0 +1,62 @@
+import time
+
+from config import FACE_STREAM_DETECT_MAX_SIDE, FACE_TRACK_MAX_MISSING, FACE_TRACK_REEMBED_GAIN
+from model_train import face_recog
+from model_train.face_recog import decode_image, detect_faces, crop_faces, embed_faces
+from model_train.tracking import FaceTracker
+
+
+class StreamSession:
+    # Per-connection state for a camera stream: cheap detection on every frame,
+    # embedding only for new tracks or tracks whose face got noticeably better.
+
+    def __init__(self):
+        self.tracker = FaceTracker(max_missing=FACE_TRACK_MAX_MISSING, reembed_gain=FACE_TRACK_REEMBED_GAIN)
+        self.frame_index = 0
+        self.embedded = 0
+        self.started = time.perf_counter()
+
+    def process_frame(self, data):
+        # Returns [(track, embedding)] for the tracks embedded from this frame
+        client = face_recog.client
+        if client is not None and isinstance(data, (bytes, bytearray)):
+            return self.process_remote(client, data)
+
+        img = decode_image(data) if isinstance(data, (bytes, bytearray)) else data
+        if img is None:
+            return []
+        self.frame_index += 1
+
+        boxes, probs = detect_faces([img], FACE_STREAM_DETECT_MAX_SIDE, with_probs=True)
+        to_embed = self.tracker.update(boxes[0], probs[0], self.frame_index)
+        if not to_embed:
+            return []
+
+        embeddings = embed_faces(crop_faces(img, [box for _, box in to_embed]))
+        return self.embedded_tracks(to_embed, embeddings)
+
+    def process_remote(self, client, data):
+        # Detection and embedding run in the inference server; only tracking stays here
+        with client.shared_image(data) as image:
+            detected = client.detect(image, FACE_STREAM_DETECT_MAX_SIDE)
+            if detected is None:
+                return []
+            self.frame_index += 1
+
+            to_embed = self.tracker.update(*detected, self.frame_index)
+            if not to_embed:
+                return []
+            embeddings = client.embed_boxes(image, [box for _, box in to_embed])
+        return self.embedded_tracks(to_embed, embeddings)
+
+    def embedded_tracks(self, to_embed, embeddings):
+        self.embedded += len(to_embed)
+        return [(track, embedding) for (track, _), embedding in zip(to_embed, embeddings)]
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "frames": self.frame_index,
+            "embedded_faces": self.embedded,
+            "fps": round(self.frame_index / elapsed, 2) if elapsed else 0.0,
+        }
@@ -0,0 +1,28 @@
+import numpy as np
+from model_train.ann import spherical_kmeans
+from model_train.gallery import normalize
+
+
+def build_templates(embeddings, max_templates=1, outlier_threshold=0.35, min_photos_per_template=3):
+    # Aggregate one user's photo embeddings into up to max_templates normalised
+    # centroids. Photos further than outlier_threshold (cosine distance) from the
+    # user's mean are dropped first so one bad photo can't drag the template.
+    # Returns (templates, kept_mask).
+    rows = normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+    if len(rows) == 0:
+        return rows, np.zeros(0, dtype=bool)
+
+    keep = np.ones(len(rows), dtype=bool)
+    while keep.sum() > 2:
+        center = normalize(rows[keep].mean(axis=0))
+        distances = 1 - rows @ center
+        worst = int(np.argmax(np.where(keep, distances, -np.inf)))
+        if distances[worst] <= outlier_threshold:
+            break
+        keep[worst] = False
+
+    kept = rows[keep]
+    count = max(1, min(max_templates, len(kept) // min_photos_per_template))
+    if count == 1:
+        return normalize(kept.mean(axis=0, keepdims=True)), keep
+    return spherical_kmeans(kept, count), keep
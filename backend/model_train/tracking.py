@@ -0,0 +1,71 @@
+import numpy as np
+
+
+def iou(box, boxes):
+    # Intersection over union of one box against an (n, 4) array of boxes
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+class Track:
+    def __init__(self, track_id, box, quality, frame_index):
+        self.id = track_id
+        self.box = box
+        self.quality = quality
+        self.last_seen = frame_index
+        self.embedded_quality = 0.0
+        self.user_name = None
+
+
+class FaceTracker:
+    # Greedy IoU tracker: detections are matched to the track whose last box
+    # overlaps most. A track asks to be embedded when it first appears and again
+    # only while unrecognized and its face quality improves by reembed_gain.
+
+    def __init__(self, min_iou=0.3, max_missing=15, reembed_gain=1.3):
+        self.min_iou = min_iou
+        self.max_missing = max_missing
+        self.reembed_gain = reembed_gain
+        self.tracks = {}
+        self._next_id = 1
+
+    def update(self, boxes, probs, frame_index):
+        # Returns [(track, box)] that should be (re)embedded from this frame
+        boxes = np.zeros((0, 4)) if boxes is None else np.asarray(boxes, dtype=np.float32)
+        probs = np.zeros(0) if probs is None else np.asarray(probs, dtype=np.float32)
+        to_embed = []
+        unmatched = list(self.tracks.values())
+
+        for box, prob in zip(boxes, probs):
+            quality = float(prob) * float(np.sqrt(max((box[2] - box[0]) * (box[3] - box[1]), 0)))
+            track = None
+            if unmatched:
+                overlaps = iou(box, np.stack([t.box for t in unmatched]))
+                best = int(np.argmax(overlaps))
+                if overlaps[best] >= self.min_iou:
+                    track = unmatched.pop(best)
+
+            if track is None:
+                track = Track(self._next_id, box, quality, frame_index)
+                self.tracks[track.id] = track
+                self._next_id += 1
+            track.box = box
+            track.last_seen = frame_index
+            track.quality = quality
+
+            if track.embedded_quality == 0.0 or (
+                track.user_name is None and quality >= track.embedded_quality * self.reembed_gain
+            ):
+                track.embedded_quality = quality
+                to_embed.append((track, box))
+
+        for track_id, track in list(self.tracks.items()):
+            if frame_index - track.last_seen > self.max_missing:
+                del self.tracks[track_id]
+        return to_embed
@@ -0,0 +1,89 @@
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from config import ATTENDANCE_PARTITIONS_AHEAD, ATTENDANCE_RETENTION_MONTHS
+from database import engine
+
+# Monthly partitions of attendance are named attendance_YYYY_MM
+PARTITION_NAME = re.compile(r"^attendance_(\d{4})_(\d{2})$")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(connection):
+    return connection.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'attendance' AND c.relnamespace = 'public'::regnamespace
+    """)).first() is not None
+
+
+def partition_months(connection):
+    rows = connection.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'attendance'
+    """))
+    months = {}
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def create_partitions(connection, today, months_ahead):
+    # This month and the next months_ahead, if missing
+    existing = partition_months(connection)
+    first = date(today.year, today.month, 1)
+    created = 0
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        if month in existing:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(text(
+                    f"CREATE TABLE attendance_{month:%Y_%m} PARTITION OF attendance "
+                    f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+                ))
+            created += 1
+        except Exception as e:
+            # Usually rows for that month already sit in attendance_default
+            print(f"[Partition attendance_{month:%Y_%m} not created]: {e}")
+    return created
+
+
+def detach_partitions(connection, today, retention_months):
+    # Partitions older than retention_months are detached and kept as
+    # attendance_archive_YYYY_MM tables for export or dropping
+    oldest_kept = add_months(date(today.year, today.month, 1), 1 - retention_months)
+    detached = 0
+    for month, name in sorted(partition_months(connection).items()):
+        if month >= oldest_kept:
+            break
+        connection.execute(text(f"ALTER TABLE attendance DETACH PARTITION {name}"))
+        connection.execute(text(f"ALTER TABLE {name} RENAME TO attendance_archive_{month:%Y_%m}"))
+        print(f"Detached {name}")
+        detached += 1
+    return detached
+
+
+def maintain_partitions():
+    # Scheduled daily; a no-op unless attendance is a partitioned Postgres table
+    if engine.dialect.name != "postgresql":
+        return 0
+    today = date.today()
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return 0
+        changed = create_partitions(connection, today, ATTENDANCE_PARTITIONS_AHEAD)
+        if ATTENDANCE_RETENTION_MONTHS > 0:
+            changed += detach_partitions(connection, today, ATTENDANCE_RETENTION_MONTHS)
+    return changed
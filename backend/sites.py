@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import or_
+
+from config import OFFICE_SITE_TTL, OFFICE_SITE_CELL_DEGREES
+from gazetteer import GridIndex, haversine_m
+from model import OfficeLocation
+
+# Detached copy of an office_location row, safe to share between requests
+Site = namedtuple("Site", "id name latitude longitude radius_meter resolved_address")
+
+
+class SiteIndex:
+    # All office sites of one company. A check-in is matched against the sites
+    # whose circle could contain it (grid lookup over the largest radius), and
+    # the closest containing site wins.
+
+    def __init__(self, sites):
+        self.sites = sites
+        self.radii = np.asarray([site.radius_meter for site in sites], dtype=np.float64)
+        self.max_radius = float(self.radii.max()) if sites else 0.0
+        self.grid = GridIndex(
+            [site.latitude for site in sites], [site.longitude for site in sites], OFFICE_SITE_CELL_DEGREES
+        )
+
+    def __len__(self):
+        return len(self.sites)
+
+    def locate(self, latitude, longitude):
+        # (site, distance, inside): the containing site, or the nearest one when outside all of them
+        if not self.sites:
+            return None, None, False
+        ids, distances = self.grid.within(latitude, longitude, self.max_radius)
+        inside = distances <= self.radii[ids]
+        if inside.any():
+            best = int(np.argmin(np.where(inside, distances, np.inf)))
+            return self.sites[ids[best]], float(distances[best]), True
+
+        distances = haversine_m(latitude, longitude, self.grid.lats, self.grid.lons)
+        best = int(np.argmin(distances))
+        return self.sites[best], float(distances[best]), False
+
+
+class SiteCache:
+    # SiteIndex per company. Admin edits invalidate it in this worker; other
+    # workers reload after ttl seconds.
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, company_id, db):
+        with self._lock:
+            entry = self._entries.get(company_id)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            return entry[0]
+
+        index = SiteIndex(load_sites(company_id, db))
+        with self._lock:
+            self._entries[company_id] = (index, time.monotonic())
+        return index
+
+    def invalidate(self, company_id):
+        with self._lock:
+            self._entries.pop(company_id, None)
+
+
+def load_sites(company_id, db):
+    # Locations saved before sites were per company have no company_id; they apply
+    # to every company that hasn't saved sites of its own
+    rows = (
+        db.query(OfficeLocation)
+        .filter(or_(OfficeLocation.company_id == company_id, OfficeLocation.company_id.is_(None)))
+        .order_by(OfficeLocation.company_id.is_(None), OfficeLocation.id)
+        .all()
+    )
+    own = [row for row in rows if row.company_id is not None]
+    return [
+        Site(row.id, row.name, row.latitude, row.longitude, row.radius_meter or 100, row.resolved_address)
+        for row in own or rows
+    ]
+
+
+def adopt_legacy_sites(company_id, db):
+    # A company's first edit copies the shared legacy locations into its own sites,
+    # leaving the shared rows to the companies still using them. Returns {legacy id: copy}
+    if db.query(OfficeLocation.id).filter(OfficeLocation.company_id == company_id).first():
+        return {}
+    copies = {}
+    for row in db.query(OfficeLocation).filter(OfficeLocation.company_id.is_(None)).order_by(OfficeLocation.id):
+        copies[row.id] = OfficeLocation(
+            name=row.name,
+            latitude=row.latitude,
+            longitude=row.longitude,
+            radius_meter=row.radius_meter,
+            resolved_address=row.resolved_address,
+            company_id=company_id,
+        )
+        db.add(copies[row.id])
+    db.flush()
+    return copies
+
+
+site_cache = SiteCache(OFFICE_SITE_TTL)
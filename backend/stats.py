@@ -0,0 +1,29 @@
+from sqlalchemy import func
+
+from model import Attendance
+
+# Queries behind the attendance stats and record routes; explain_hot_queries
+# checks these same statements for full-table scans
+
+
+def in_period(query, start, end):
+    # A date bound lets Postgres skip attendance partitions outside the period
+    if start:
+        query = query.filter(Attendance.date >= start)
+    if end:
+        query = query.filter(Attendance.date <= end)
+    return query
+
+
+def status_counts_query(user_id, start, end, db):
+    # Attendance rows per status in one pass over the user's rows
+    query = db.query(Attendance.status, func.count()).filter(Attendance.user_id == user_id)
+    return in_period(query, start, end).group_by(Attendance.status)
+
+
+def status_counts(user_id, start, end, db):
+    return dict(status_counts_query(user_id, start, end, db).all())
+
+
+def attendance_record_query(user_id, start, end, db):
+    return in_period(db.query(Attendance).filter(Attendance.user_id == user_id), start, end)